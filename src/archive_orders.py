@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import os
+import re
+
+import asyncpg
+from config.settings import Settings
+from repositories.order_repository import OrderRepository
+
+partition_pattern = re.compile(r"^orders_(\d{4})_(\d{2})$")
+
+
+async def export_table(conn: asyncpg.Connection, table: str, path: str) -> None:
+    with gzip.open(path, "wb") as f:
+
+        async def write(chunk: bytes) -> None:
+            f.write(chunk)
+
+        await conn.copy_from_table(table, output=write, format="csv", header=True)
+
+
+def count_exported_rows(path: str) -> int:
+    # Read back as CSV, so values spanning several lines still count once, less the header.
+    with gzip.open(path, "rt", newline="") as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+async def archive_orders(before: str, output_dir: str) -> None:
+    settings = Settings()  # type: ignore
+    order_repository = OrderRepository()
+    conn = await asyncpg.connect(settings.POSTGRES_URL)
+
+    try:
+        for partition in await order_repository.get_order_partitions(db=conn):
+            match = partition_pattern.match(partition)
+            if not match or f"{match[1]}-{match[2]}" >= before:
+                continue
+
+            suffix = f"{match[1]}_{match[2]}"
+            print(f"Archiving orders for {match[1]}-{match[2]}")
+            # Exported while still attached, so a failed export leaves the partition untouched.
+            orders_path = os.path.join(output_dir, f"orders_{suffix}.csv.gz")
+            order_details_path = os.path.join(output_dir, f"order_details_{suffix}.csv.gz")
+            await export_table(conn, f"orders_{suffix}", orders_path)
+            await export_table(conn, f"order_details_{suffix}", order_details_path)
+            exported = (count_exported_rows(orders_path), count_exported_rows(order_details_path))
+
+            async with conn.transaction():
+                # Dropped only when the files hold every row, so rows written since the export are not lost.
+                counted = await order_repository.count_order_partition_rows(suffix=suffix, db=conn)
+                if exported != counted:
+                    print(f"Keeping orders for {match[1]}-{match[2]}: exported {exported} rows, found {counted}")
+                    continue
+
+                await order_repository.drop_order_partition(suffix=suffix, db=conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export monthly order partitions and detach them.")
+    parser.add_argument("--before", required=True, help="archive months before this one, as YYYY-MM")
+    parser.add_argument("--output-dir", default=".", help="directory for the exported .csv.gz files")
+    args = parser.parse_args()
+
+    if not re.match(r"^\d{4}-\d{2}$", args.before):
+        parser.error("--before must look like YYYY-MM")
+
+    asyncio.run(archive_orders(args.before, args.output_dir))
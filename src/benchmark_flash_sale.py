@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import time
+
+import asyncpg
+import redis
+from config.settings import Settings
+from repositories.flash_sale_repository import FlashSaleRepository
+from repositories.item_repository import ItemRepository
+from repositories.job_repository import JobRepository
+from services.flash_sale_service import FlashSaleService
+from states import PostgresClient
+
+# Jobs enqueued by the benchmark use their own kind, so a running API never applies them.
+benchmark_job_kind = "flash_sale_benchmark"
+
+
+async def buy_with_sql(item_repository: ItemRepository, pool: asyncpg.Pool, item_id: int) -> bool:
+    # The regular checkout path: read the stock, then take it off the items row, in one transaction.
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            item = await item_repository.get_item(item_id=item_id, db=conn)
+            if item["qty"] < 1:  # type: ignore
+                return False
+            return await item_repository.decrease_qty(item_id=item_id, qty=1, db=conn)
+
+
+async def buy_with_redis(
+    flash_sale_service: FlashSaleService, job_repository: JobRepository, pool: asyncpg.Pool, item_id: int
+) -> bool:
+    # The flash sale path: reserve in Redis, enqueue the commit job with the order, then confirm.
+    reservation_id, shortage = flash_sale_service.reserve(qtys={item_id: 1})
+    if shortage:
+        return False
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await flash_sale_service.hold_reservation(reservation_id=reservation_id, db=conn)
+            payload = {"reservation_id": reservation_id, "items": {item_id: 1}}
+            await job_repository.enqueue(kind=benchmark_job_kind, payload=payload, delay=0, max_attempts=1, db=conn)
+
+    flash_sale_service.confirm(reservation_id)
+    return True
+
+
+async def run(name: str, buy, orders: int, concurrency: int) -> None:
+    attempts = iter(range(orders))
+    sold = 0
+
+    async def buyer() -> None:
+        nonlocal sold
+        for _ in attempts:
+            if await buy():
+                sold += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+    print(f"{name}: {sold} orders in {duration:.2f} s, {sold / duration:.0f} orders/sec")
+
+
+async def benchmark(orders: int, concurrency: int) -> None:
+    settings = Settings()  # type: ignore
+    postgres_client = PostgresClient(settings.POSTGRES_URL, [], 0, 0, concurrency + 2, 1)
+    await postgres_client.setup()
+    pool: asyncpg.Pool = postgres_client.pool  # type: ignore
+    redis_client = redis.Redis(
+        host=settings.REDIS_HOST, port=settings.REDIS_PORT, password=settings.REDIS_PWD, decode_responses=True
+    )
+    item_repository = ItemRepository()
+    job_repository = JobRepository()
+    flash_sale_service = FlashSaleService(
+        FlashSaleRepository(), item_repository, job_repository, settings, redis_client
+    )
+
+    async with pool.acquire() as conn:
+        sql_item = await item_repository.register_item(
+            name="benchmark sql item", price=1, category="benchmark", qty=orders, db=conn
+        )
+        flash_sale_item = await item_repository.register_item(
+            name="benchmark flash sale item", price=1, category="benchmark", qty=orders, db=conn
+        )
+        await flash_sale_service.start_flash_sale(item_id=flash_sale_item["id"], db=conn)
+
+    try:
+        await run("sql", lambda: buy_with_sql(item_repository, pool, sql_item["id"]), orders, concurrency)
+        await run(
+            "flash sale",
+            lambda: buy_with_redis(flash_sale_service, job_repository, pool, flash_sale_item["id"]),
+            orders,
+            concurrency,
+        )
+    finally:
+        flash_sale_service.end_flash_sale(item_id=flash_sale_item["id"])
+        async with pool.acquire() as conn:
+            await conn.execute("delete from jobs where kind = $1;", benchmark_job_kind)
+            await item_repository.remove_item(item_id=sql_item["id"], db=conn)
+            await item_repository.remove_item(item_id=flash_sale_item["id"], db=conn)
+        await postgres_client.teardown()
+        redis_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare orders/sec on one SKU with SQL and flash sale stock.")
+    parser.add_argument("--orders", type=int, default=2000, help="stock of the benchmark item, one unit per order")
+    parser.add_argument("--concurrency", type=int, default=50, help="buyers checking out at the same time")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.orders, args.concurrency))
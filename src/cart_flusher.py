@@ -0,0 +1,69 @@
+import asyncio
+
+import asyncpg
+import redis
+from repositories.cart_repository import CartRepository
+from repositories.redis_cart_repository import RedisCartRepository
+
+cart_lock_namespace = 4_127
+
+
+class CartFlusher:
+    def __init__(self, interval: float = 1.0, batch_size: int = 100):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.cart_repository = CartRepository()
+        self.redis_cart_repository = RedisCartRepository()
+        self.pool = None
+        self.redis = None
+        self.flush_task = None
+
+    async def flush_cart(self, user_id: int) -> None:
+        async with self.pool.acquire() as conn:  # type: ignore
+            async with conn.transaction():
+                # Reading Redis under the lock means whichever worker commits last wrote the newest cart.
+                await conn.execute("select pg_advisory_xact_lock($1, $2);", cart_lock_namespace, user_id)
+                qtys = self.redis_cart_repository.get_cart(user_id=user_id, redis=self.redis)  # type: ignore
+                await self.cart_repository.replace_cart(user_id=user_id, qtys=qtys, db=conn)
+
+    async def flush(self) -> int:
+        flushed = 0
+
+        while True:
+            user_ids = self.redis_cart_repository.pop_dirty_carts(
+                count=self.batch_size, redis=self.redis  # type: ignore
+            )
+            if not user_ids:
+                return flushed
+
+            for i, user_id in enumerate(user_ids):
+                try:
+                    await self.flush_cart(user_id)
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, redis.RedisError) as exc:
+                    print(f"Flushing carts failed: {exc}")
+                    self.redis_cart_repository.mark_dirty(user_ids=user_ids[i:], redis=self.redis)  # type: ignore
+                    return flushed
+                flushed += 1
+
+    async def flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except redis.RedisError as exc:
+                print(f"Flushing carts failed: {exc}")
+
+    def setup(self, pool: asyncpg.Pool, redis: redis.Redis) -> None:
+        self.pool = pool
+        self.redis = redis
+        self.flush_task = asyncio.create_task(self.flush_periodically())
+
+    async def teardown(self) -> None:
+        if self.flush_task:
+            self.flush_task.cancel()
+
+        # Carts changed since the last round are written out before the pool closes.
+        try:
+            await self.flush()
+        except redis.RedisError as exc:
+            print(f"Flushing carts failed: {exc}")
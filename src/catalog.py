@@ -0,0 +1,332 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+
+import asyncpg
+from models import ItemModel
+from repositories.item_repository import ItemRepository
+
+
+class ItemChangeListener:
+    channel = "item_changes"
+
+    def __init__(self, url: str, heartbeat_interval: float = 1.0):
+        self.url = url
+        self.heartbeat_interval = heartbeat_interval
+        self.conn = None
+        self.subscribers = []
+        self.synced_at = 0.0
+        self.heartbeat_task = None
+
+    def subscribe(self, subscriber) -> None:
+        self.subscribers.append(subscriber)
+
+    def handle_notification(self, conn, pid: int, channel: str, payload: str) -> None:
+        change = json.loads(payload)
+        for subscriber in self.subscribers:
+            subscriber.apply_change(change)
+
+    def get_staleness(self) -> float:
+        return time.monotonic() - self.synced_at
+
+    async def connect(self) -> None:
+        self.conn = await asyncpg.connect(self.url)
+        await self.conn.add_listener(self.channel, self.handle_notification)
+        self.synced_at = time.monotonic()
+
+    async def heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if self.conn is None or self.conn.is_closed():
+                    # Notifications sent while disconnected are lost, so subscribers rebuild from the table.
+                    await self.connect()
+                    for subscriber in self.subscribers:
+                        await subscriber.reload()
+
+                await self.conn.fetchval("select 1;")  # type: ignore
+                self.synced_at = time.monotonic()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Item change listener heartbeat failed: {exc}")
+                if self.conn:
+                    self.conn.terminate()
+                    self.conn = None
+
+    async def setup(self) -> None:
+        await self.connect()
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+
+    async def teardown(self) -> None:
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+
+        if self.conn:
+            await self.conn.close()
+
+
+def get_version_hash(item_id: int, version: int) -> int:
+    # Matches the md5 sum in ItemRepository.get_catalog_version, so both paths give the same ETags.
+    return int(hashlib.md5(f"{item_id}:{version}".encode()).hexdigest()[:15], 16)
+
+
+class CatalogColumns:
+    def __init__(self):
+        self.ids = array("q")
+        self.names: list[str] = []
+        self.prices = array("d")
+        self.categories: list[str] = []
+        self.qtys = array("q")
+        self.versions = array("q")
+        self.updated_ats = array("d")
+        self.alive = array("b")
+        self.row_by_id: dict[int, int] = {}
+        self.rows_by_category: dict[str, array] = {}
+        # Versions are taken before commit, so a later commit can carry a lower one; a sum over every
+        # (id, version) changes on any commit, where the max version may not.
+        self.version_sum = 0
+
+    def upsert(self, item: dict) -> None:
+        category = sys.intern(item["category"])
+        updated_at = item["updated_at"]
+        if isinstance(updated_at, str):
+            updated_at = datetime.fromisoformat(updated_at)
+        row = self.row_by_id.get(item["id"])
+        self.version_sum += get_version_hash(item["id"], item["version"])
+        if row is not None:
+            self.version_sum -= get_version_hash(item["id"], self.versions[row])
+
+        if row is None:
+            row = len(self.ids)
+            self.ids.append(item["id"])
+            self.names.append(item["name"])
+            self.prices.append(float(item["price"]))
+            self.categories.append(category)
+            self.qtys.append(item["qty"])
+            self.versions.append(item["version"])
+            self.updated_ats.append(updated_at.timestamp())
+            self.alive.append(1)
+            self.row_by_id[item["id"]] = row
+            self.rows_by_category.setdefault(category, array("I")).append(row)
+            return
+
+        if self.categories[row] != category:
+            self.rows_by_category[self.categories[row]].remove(row)
+            self.rows_by_category.setdefault(category, array("I")).append(row)
+            self.categories[row] = category
+
+        self.names[row] = item["name"]
+        self.prices[row] = float(item["price"])
+        self.qtys[row] = item["qty"]
+        self.versions[row] = item["version"]
+        self.updated_ats[row] = updated_at.timestamp()
+
+    def delete(self, item_id: int) -> None:
+        row = self.row_by_id.pop(item_id, None)
+        if row is None:
+            return
+
+        self.alive[row] = 0
+        self.version_sum -= get_version_hash(item_id, self.versions[row])
+        self.rows_by_category[self.categories[row]].remove(row)
+
+    def apply_change(self, change: dict) -> None:
+        if change["op"] == "DELETE":
+            self.delete(change["item"]["id"])
+        else:
+            self.upsert(change["item"])
+
+    def get_item_model(self, row: int) -> ItemModel:
+        return ItemModel.model_construct(
+            id=self.ids[row],
+            name=self.names[row],
+            price=self.prices[row],
+            category=self.categories[row],
+            qty=self.qtys[row],
+        )
+
+    def get_item(self, item_id: int) -> ItemModel | None:
+        row = self.row_by_id.get(item_id)
+        if row is None:
+            return None
+
+        return self.get_item_model(row)
+
+    def get_all_items(self) -> list[ItemModel]:
+        return [self.get_item_model(row) for row in range(len(self.ids)) if self.alive[row]]
+
+    def get_items_by_category(self, category: str) -> list[ItemModel]:
+        return [self.get_item_model(row) for row in self.rows_by_category.get(category, ())]
+
+    def get_item_version(self, item_id: int) -> dict | None:
+        row = self.row_by_id.get(item_id)
+        if row is None:
+            return None
+
+        return {
+            "version": self.versions[row],
+            "updated_at": datetime.fromtimestamp(self.updated_ats[row], timezone.utc),
+        }
+
+    def get_catalog_version(self) -> dict:
+        return {"count": len(self.row_by_id), "version": self.version_sum}
+
+    def get_category_version(self, category: str) -> dict:
+        rows = self.rows_by_category.get(category, ())
+        return {
+            "count": len(rows),
+            "version": sum(get_version_hash(self.ids[row], self.versions[row]) for row in rows),
+        }
+
+
+class CatalogSnapshot:
+    def __init__(self, listener: ItemChangeListener, max_staleness: float = 5.0):
+        self.listener = listener
+        self.max_staleness = max_staleness
+        self.item_repository = ItemRepository()
+        self.pool = None
+        self.columns = CatalogColumns()
+        self.loaded = False
+        self.reloading = False
+        self.pending_changes = []
+
+    def is_fresh(self) -> bool:
+        return self.loaded and self.listener.get_staleness() <= self.max_staleness
+
+    def apply_change(self, change: dict) -> None:
+        if self.reloading:
+            self.pending_changes.append(change)
+
+        self.columns.apply_change(change)
+
+    async def reload(self) -> None:
+        self.loaded = False
+        self.reloading = True
+        self.pending_changes = []
+
+        try:
+            async with self.pool.acquire() as conn:  # type: ignore
+                items = await self.item_repository.get_all_items(db=conn)
+
+            # Changes that arrived while the table was being read are replayed in order over the fresh columns.
+            columns = CatalogColumns()
+            for item in items:
+                columns.upsert(dict(item))
+            for change in self.pending_changes:
+                columns.apply_change(change)
+
+            self.columns = columns
+            self.loaded = True
+        finally:
+            self.reloading = False
+            self.pending_changes = []
+
+    def get_item(self, item_id: int) -> ItemModel | None:
+        return self.columns.get_item(item_id)
+
+    def get_all_items(self) -> list[ItemModel]:
+        return self.columns.get_all_items()
+
+    def get_items_by_category(self, category: str) -> list[ItemModel]:
+        return self.columns.get_items_by_category(category)
+
+    def get_item_version(self, item_id: int) -> dict | None:
+        return self.columns.get_item_version(item_id)
+
+    def get_catalog_version(self) -> dict:
+        return self.columns.get_catalog_version()
+
+    def get_category_version(self, category: str) -> dict:
+        return self.columns.get_category_version(category)
+
+    async def setup(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        self.listener.subscribe(self)
+        await self.reload()
+
+
+class ItemNameIndex:
+    def __init__(self, refresh_interval: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self.item_repository = ItemRepository()
+        self.pool = None
+        self.refresh_task = None
+        self.entries: list[tuple[str, str]] = []
+
+    @staticmethod
+    def get_entries(name: str) -> list[tuple[str, str]]:
+        # One entry per word so "apple" also completes "Red Apple".
+        words = name.lower().split()
+        return [(" ".join(words[i:]), name) for i in range(len(words))]
+
+    def load(self, names: list[str]) -> None:
+        entries = []
+        for name in names:
+            entries.extend(self.get_entries(name))
+
+        entries.sort()
+        self.entries = entries
+
+    def add(self, name: str) -> None:
+        for entry in self.get_entries(name):
+            i = bisect.bisect_left(self.entries, entry)
+            if i == len(self.entries) or self.entries[i] != entry:
+                self.entries.insert(i, entry)
+
+    def remove(self, name: str) -> None:
+        for entry in self.get_entries(name):
+            i = bisect.bisect_left(self.entries, entry)
+            if i < len(self.entries) and self.entries[i] == entry:
+                del self.entries[i]
+
+    def complete(self, prefix: str, limit: int) -> list[str]:
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+
+        names = []
+        entries = self.entries
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix) and len(names) < limit:
+            name = entries[i][1]
+            if name not in names:
+                names.append(name)
+            i += 1
+
+        return names
+
+    def apply_change(self, change: dict) -> None:
+        if change["op"] == "INSERT":
+            self.add(change["item"]["name"])
+        elif change["op"] == "DELETE":
+            self.remove(change["item"]["name"])
+
+    async def refresh(self) -> None:
+        async with self.pool.acquire() as conn:  # type: ignore
+            names = await self.item_repository.get_item_names(db=conn)
+        self.load(names)
+
+    async def reload(self) -> None:
+        await self.refresh()
+
+    async def refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Item name index refresh failed: {exc}")
+
+    async def setup(self, pool: asyncpg.Pool, listener: ItemChangeListener) -> None:
+        self.pool = pool
+        listener.subscribe(self)
+        await self.refresh()
+        self.refresh_task = asyncio.create_task(self.refresh_periodically())
+
+    async def teardown(self) -> None:
+        if self.refresh_task:
+            self.refresh_task.cancel()
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+
+from catalog import ItemChangeListener
+
+item_fields = ("id", "name", "price", "category", "qty", "version")
+
+
+class ChangeFeedClient:
+    def __init__(self, item_ids: set[int] | None, max_pending: int):
+        self.item_ids = item_ids
+        self.max_pending = max_pending
+        # Latest change per item, so an item updated many times between sends goes out once.
+        self.pending: dict[int, dict] = {}
+        self.resync = False
+        self.closed = False
+        self.ready = asyncio.Event()
+
+    def push(self, change: dict) -> bool:
+        item_id = change["item"]["id"]
+        coalesced = item_id in self.pending
+
+        if not coalesced and len(self.pending) >= self.max_pending:
+            # Too far behind to catch up change by change, so the client is told to refetch instead.
+            self.pending = {}
+            self.resync = True
+        else:
+            self.pending[item_id] = change
+
+        self.ready.set()
+        return coalesced
+
+    def request_resync(self) -> None:
+        self.pending = {}
+        self.resync = True
+        self.ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self.ready.set()
+
+    def take(self) -> tuple[list[dict], bool]:
+        changes, resync = list(self.pending.values()), self.resync
+        self.pending, self.resync = {}, False
+        self.ready.clear()
+        return changes, resync
+
+
+class ItemChangeFeed:
+    def __init__(
+        self,
+        max_subscribers: int = 1000,
+        max_pending: int = 500,
+        coalesce_interval: float = 0.25,
+        heartbeat_interval: float = 15.0,
+        max_duration: float = 300.0,
+    ):
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.coalesce_interval = coalesce_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_duration = max_duration
+        self.clients: set[ChangeFeedClient] = set()
+        self.all_item_clients: set[ChangeFeedClient] = set()
+        self.clients_by_item: dict[int, set[ChangeFeedClient]] = {}
+        self.metrics = {"changes": 0, "sent": 0, "coalesced": 0, "resyncs": 0, "rejected": 0}
+
+    def apply_change(self, change: dict) -> None:
+        item_id = change["item"]["id"]
+        self.metrics["changes"] += 1
+
+        for client in (*self.all_item_clients, *self.clients_by_item.get(item_id, ())):
+            if client.push(change):
+                self.metrics["coalesced"] += 1
+
+    async def reload(self) -> None:
+        # Notifications were missed while the listener was disconnected, so every client refetches.
+        for client in self.clients:
+            client.request_resync()
+
+    def has_capacity(self) -> bool:
+        if len(self.clients) >= self.max_subscribers:
+            self.metrics["rejected"] += 1
+            return False
+
+        return True
+
+    def connect(self, item_ids: set[int] | None) -> ChangeFeedClient | None:
+        if not self.has_capacity():
+            return None
+
+        client = ChangeFeedClient(item_ids, self.max_pending)
+        self.clients.add(client)
+        if item_ids is None:
+            self.all_item_clients.add(client)
+        else:
+            for item_id in item_ids:
+                self.clients_by_item.setdefault(item_id, set()).add(client)
+
+        return client
+
+    def disconnect(self, client: ChangeFeedClient) -> None:
+        self.clients.discard(client)
+        self.all_item_clients.discard(client)
+        for item_id in client.item_ids or ():
+            clients = self.clients_by_item.get(item_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.clients_by_item[item_id]
+
+    @staticmethod
+    def format_event(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    async def stream(self, item_ids: set[int] | None):
+        # Streams end after max_duration, and EventSource reconnects, so workers can drain during deploys.
+        deadline = time.monotonic() + self.max_duration
+        client = None
+
+        # Registered only once the body starts, so a client that drops before then never holds a slot.
+        try:
+            client = self.connect(item_ids)
+            if not client:
+                return
+
+            yield "retry: 3000\n\n"
+            while not client.closed and time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(client.ready.wait(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                # Gives rapid updates to the same item a moment to collapse into one event.
+                await asyncio.sleep(self.coalesce_interval)
+                changes, resync = client.take()
+
+                if resync:
+                    self.metrics["resyncs"] += 1
+                    yield self.format_event("resync", {})
+
+                for change in changes:
+                    item = {field: change["item"].get(field) for field in item_fields}
+                    self.metrics["sent"] += 1
+                    # The next change is only taken once this one is written, so a slow client
+                    # holds a bounded set of coalesced changes rather than a growing queue.
+                    yield self.format_event("item", {"op": change["op"], "item": item})
+        finally:
+            if client:
+                self.disconnect(client)
+
+    def setup(self, listener: ItemChangeListener) -> None:
+        listener.subscribe(self)
+
+    def teardown(self) -> None:
+        for client in self.clients:
+            client.close()
+
+    def get_metrics(self) -> dict:
+        return {"subscribers": len(self.clients), **self.metrics}
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import redis
+from tracing import TracedPipeline, TracedRedis
+
+
+class RedisUnavailableError(redis.ConnectionError):
+    pass
+
+
+# Errors meaning Redis could not be reached in time, as opposed to Redis rejecting a command.
+redis_unavailable_errors = (redis.ConnectionError, redis.TimeoutError)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.metrics = {"opened": 0, "rejected": 0, "failures": 0}
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == "closed":
+                return True
+
+            # After the cool-down a single call goes through to find out whether the dependency is back.
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+
+            self.metrics["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.metrics["failures"] += 1
+
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.metrics["opened"] += 1
+                print(f"Circuit breaker opened after {self.failures} failures")
+
+    def end_trial(self) -> None:
+        with self.lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def call(self, call):
+        if not self.allow():
+            raise RedisUnavailableError("Redis circuit breaker is open.")
+
+        try:
+            result = call()
+        except redis_unavailable_errors:
+            self.record_failure()
+            raise
+        except redis.RedisError:
+            # Redis answered, just with an error, so it still counts as reachable.
+            self.record_success()
+            raise
+        except BaseException:
+            # Says nothing about Redis, but a half-open trial must still end, or every later call is rejected.
+            self.end_trial()
+            raise
+
+        self.record_success()
+        return result
+
+    def get_metrics(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.metrics}
+
+
+class CircuitBreakerPipeline(TracedPipeline):
+    breaker: CircuitBreaker
+
+    def execute(self, raise_on_error: bool = True):
+        return self.breaker.call(lambda: super(CircuitBreakerPipeline, self).execute(raise_on_error))
+
+
+class CircuitBreakerRedis(TracedRedis):
+    def __init__(self, breaker: CircuitBreaker, **kwargs):
+        super().__init__(**kwargs)
+        self.breaker = breaker
+
+    def execute_command(self, *args, **options):
+        return self.breaker.call(lambda: super(CircuitBreakerRedis, self).execute_command(*args, **options))
+
+    def pipeline(self, transaction=True, shard_hint=None) -> CircuitBreakerPipeline:
+        pipeline = CircuitBreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipeline.breaker = self.breaker
+        return pipeline
@@ -5,8 +5,64 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(frozen=True)
     ENV: str
     POSTGRES_URL: str
+    POSTGRES_MAX_CONNECTIONS: int = 90  # shared by all workers
+    POSTGRES_WARM_CONNECTIONS: int = 4  # per pool, opened before the worker reports ready
+    POSTGRES_MAX_PARALLEL_READS: int = 3  # connections one request may read on at once
+    POSTGRES_PARALLEL_READ_ACQUIRE_TIMEOUT: float = 0.05  # seconds to wait for an extra connection before sharing
+    POSTGRES_REPLICA_URLS: list[str] = []
+    POSTGRES_REPLICA_MAX_LAG: float = 5.0  # seconds
+    POSTGRES_REPLICA_LAG_CHECK_INTERVAL: float = 1.0  # seconds
+    READ_YOUR_WRITES_WINDOW: int = 10  # seconds
+    ITEM_NAME_INDEX_REFRESH_INTERVAL: float = 30.0  # seconds
+    ITEM_CHANGE_HEARTBEAT_INTERVAL: float = 1.0  # seconds
+    CHANGE_FEED_MAX_SUBSCRIBERS: int = 1000  # per worker
+    CHANGE_FEED_MAX_PENDING: int = 500  # coalesced changes held per client before it is told to refetch
+    CHANGE_FEED_COALESCE_INTERVAL: float = 0.25  # seconds
+    CHANGE_FEED_HEARTBEAT_INTERVAL: float = 15.0  # seconds
+    CHANGE_FEED_MAX_DURATION: float = 300.0  # seconds before a stream ends and the client reconnects
+    CATALOG_SNAPSHOT_ENABLED: bool = False
+    CATALOG_MAX_STALENESS: float = 5.0  # seconds
+    CATALOG_CACHE_CONTROL: str = "public, max-age=5, stale-while-revalidate=30"
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    SLOW_QUERY_THRESHOLD: float = 0.1  # seconds
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.05
+    SLOW_QUERY_MAX_STATEMENTS: int = 500
+    CART_STORAGE: str = "postgres"  # "postgres", or "redis" for Redis carts written behind to Postgres
+    CART_FLUSH_INTERVAL: float = 1.0  # seconds
+    ORDER_PARTITION_MONTHS_AHEAD: int = 3
+    FLASH_SALE_RESERVATION_TTL: int = 30  # seconds a checkout may hold flash sale stock before it is released
+    FLASH_SALE_RECONCILE_INTERVAL: float = 5.0  # seconds
+    RATING_BATCH_SIZE: int = 500
+    RATING_FLUSH_INTERVAL: float = 1.0  # seconds
+    RATING_BUFFER_MAX_DEPTH: int = 50_000  # ratings held per worker before new ones are refused
+    EXPORT_DIR: str = "exports"
+    EXPORT_CHUNK_DAYS: int = 1  # days of orders per exported file
+    EXPORT_CHUNK_PAUSE: float = 1.0  # seconds between chunks, to leave I/O for live traffic
+    EXPORT_STATEMENT_TIMEOUT: float = 600.0  # seconds per chunk
+    IDEMPOTENCY_TTL: int = 24 * 3600  # seconds
+    IDEMPOTENCY_LOCK_TTL: int = 60  # seconds
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10.0  # seconds
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL: float = 1.0  # seconds
+    JOB_STALE_TIMEOUT: float = 300.0  # seconds
     JWT_KEY: str
     JWT_ALGORITHM: str
     REDIS_HOST: str
     REDIS_PORT: int
     REDIS_PWD: str
+    REDIS_SOCKET_TIMEOUT: float = 0.25  # seconds
+    REDIS_CONNECT_TIMEOUT: float = 0.25  # seconds
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the breaker
+    REDIS_BREAKER_RESET_TIMEOUT: float = 5.0  # seconds before a trial call is let through
+    AUTH_DEGRADED_POLICY: str = "local"  # without Redis, "local" checks cached revocations, "reject" fails with 503
+    REVOCATION_CACHE_REFRESH_INTERVAL: float = 5.0  # seconds
+    ADMIN_TOKEN: str | None = None
+    TRACE_SAMPLE_RATE: float = 0.0  # share of requests traced, 0 disables tracing
+    TRACE_BUFFER_SIZE: int = 200  # traces kept in memory per worker
+    TRACE_EXPORT_PATH: str | None = None  # OTLP JSON lines file
+    TRACE_SERVICE_NAME: str = "ecommerce-api"
+    WEB_CONCURRENCY: int = 1
+    HOST: str = "0.0.0.0"
+    PORT: int = 80
+    OPENAPI_CACHE_PATH: str | None = None
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30  # seconds
@@ -0,0 +1,57 @@
+import asyncio
+
+
+class DataLoader:
+    def __init__(self, batch_load):
+        self.batch_load = batch_load
+        self.batches: dict[object, dict] = {}
+        # Referenced until done, as the event loop only keeps a weak reference to running tasks.
+        self.tasks: set[asyncio.Task] = set()
+
+    async def load(self, key, db):
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(db)
+
+        if batch is None:
+            # Everything loaded before the event loop gets back to this callback shares one query.
+            batch = self.batches[db] = {}
+            loop.call_soon(self.dispatch, db)
+
+        future = batch.get(key)
+        if future is None:
+            future = batch[key] = loop.create_future()
+
+        return await future
+
+    async def load_many(self, keys: list, db) -> list:
+        return await asyncio.gather(*(self.load(key, db) for key in keys))
+
+    def dispatch(self, db) -> None:
+        batch = self.batches.pop(db)
+        task = asyncio.ensure_future(self.run_batch(batch, db))
+        self.tasks.add(task)
+        task.add_done_callback(self.finish_batch)
+
+    def finish_batch(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+
+        # Errors from the batch load reach the callers through their futures; anything else would go unseen.
+        if not task.cancelled() and task.exception():
+            print(f"Data loader batch failed: {task.exception()}")
+
+    async def run_batch(self, batch: dict, db) -> None:
+        try:
+            values = await self.batch_load(list(batch), db)
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
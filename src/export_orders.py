@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import fcntl
+import gzip
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+
+import asyncpg
+from config.settings import Settings
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# One row per order line, with the item as it was sold, taken from the summary stored on the order.
+export_query = """
+    select o.id as order_id, o.order_date at time zone 'UTC' as order_date, o.user_id, o.total as order_total,
+        od.item_id, i->>'name' as item_name, i->>'category' as category, (i->>'price')::numeric as price, od.qty
+    from orders o
+    join order_details od on od.order_id = o.id and od.order_date = o.order_date
+    left join lateral (
+        select i from jsonb_array_elements(o.summary->'item_models') i
+        where (i->>'id')::integer = od.item_id
+        limit 1
+    ) summary_item on true
+    where o.order_date >= $1 and o.order_date < $2
+    order by o.order_date, o.id
+"""
+
+export_columns = {
+    "order_id": "int32",
+    "order_date": "timestamp[us]",
+    "user_id": "int32",
+    "order_total": "float64",
+    "item_id": "int32",
+    "item_name": "string",
+    "category": "string",
+    "price": "float64",
+    "qty": "int32",
+}
+
+
+class OrderExporter:
+    def __init__(self, settings: Settings):
+        self.url = settings.POSTGRES_REPLICA_URLS[0] if settings.POSTGRES_REPLICA_URLS else settings.POSTGRES_URL
+        self.chunk_days = settings.EXPORT_CHUNK_DAYS
+        self.chunk_pause = settings.EXPORT_CHUNK_PAUSE
+        self.statement_timeout = settings.EXPORT_STATEMENT_TIMEOUT
+        self.output_dir = settings.EXPORT_DIR
+
+    async def connect(self) -> asyncpg.Connection:
+        # A replica when there is one; either way a read-only session of its own, never a pooled OLTP connection.
+        return await asyncpg.connect(
+            self.url,
+            server_settings={
+                "application_name": "orders_export",
+                "default_transaction_read_only": "on",
+                "statement_timeout": str(int(self.statement_timeout * 1000)),
+                "work_mem": "16MB",
+            },
+        )
+
+    async def copy_chunk(self, conn: asyncpg.Connection, start: datetime, end: datetime, output) -> None:
+        await conn.copy_from_query(export_query, start, end, output=output, format="csv", header=True)
+
+    async def write_csv_gz(self, conn: asyncpg.Connection, start: datetime, end: datetime, path: str) -> None:
+        with gzip.open(path, "wb") as f:
+
+            # Compressed off the event loop, as the exporter also runs as a job inside API workers.
+            async def write(chunk: bytes) -> None:
+                await asyncio.to_thread(f.write, chunk)
+
+            await self.copy_chunk(conn, start, end, write)
+
+    async def write_parquet(self, conn: asyncpg.Connection, start: datetime, end: datetime, path: str) -> None:
+        # COPY streams to a scratch CSV file, which is then read back in record batches, so memory stays bounded.
+        with tempfile.NamedTemporaryFile(suffix=".csv", dir=self.output_dir) as scratch:
+
+            async def write(chunk: bytes) -> None:
+                await asyncio.to_thread(scratch.write, chunk)
+
+            await self.copy_chunk(conn, start, end, write)
+            scratch.flush()
+            await asyncio.to_thread(self.convert_to_parquet, scratch.name, path)
+
+    @staticmethod
+    def convert_to_parquet(csv_path: str, path: str) -> None:
+        convert_options = pyarrow.csv.ConvertOptions(  # type: ignore
+            column_types={name: pyarrow.type_for_alias(alias) for name, alias in export_columns.items()}  # type: ignore
+        )
+        reader = pyarrow.csv.open_csv(csv_path, convert_options=convert_options)  # type: ignore
+        with pyarrow.parquet.ParquetWriter(path, reader.schema, compression="zstd") as writer:  # type: ignore
+            for batch in reader:
+                writer.write_batch(batch)
+
+    async def export_chunk(self, conn: asyncpg.Connection, start: date, end: date, path: str) -> None:
+        print(f"Exporting orders from {start} to {end}")
+        start_at = datetime.combine(start, time(), timezone.utc)
+        end_at = datetime.combine(end, time(), timezone.utc)
+        # Named per run, so two runs writing the same chunk never truncate each other's file.
+        partial_path = f"{path}.{uuid.uuid4().hex}.partial"
+
+        try:
+            if pyarrow:
+                await self.write_parquet(conn, start_at, end_at, partial_path)
+            else:
+                await self.write_csv_gz(conn, start_at, end_at, partial_path)
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    async def export(self, start: date, end: date) -> list[str]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        extension = "parquet" if pyarrow else "csv.gz"
+        paths = []
+
+        # One run per date range at a time; the lock goes with the process, so a crashed run does not hold it.
+        with open(os.path.join(self.output_dir, f"orders_{start.isoformat()}_{end.isoformat()}.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"Export of orders from {start} to {end} is already running")
+                return []
+
+            conn = await self.connect()
+            try:
+                day = start
+                while day < end:
+                    chunk_end = min(day + timedelta(days=self.chunk_days), end)
+                    path = os.path.join(
+                        self.output_dir, f"orders_{day.isoformat()}_{chunk_end.isoformat()}.{extension}"
+                    )
+
+                    # Finished chunks are skipped, so an interrupted export picks up where it stopped.
+                    if not os.path.exists(path):
+                        await self.export_chunk(conn, day, chunk_end, path)
+                        # Paused between chunks so the export only takes a share of the server's I/O.
+                        await asyncio.sleep(self.chunk_pause)
+
+                    paths.append(path)
+                    day = chunk_end
+            finally:
+                await conn.close()
+
+        return paths
+
+    async def export_job(self, payload: dict) -> None:
+        # Registered as a detached job: it runs outside any transaction and keeps its claim alive while it runs, and
+        # a failure is retried from the last finished chunk.
+        await self.export(date.fromisoformat(payload["start"]), date.fromisoformat(payload["end"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export orders and their lines to compressed files by date range.")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="first day, as YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="day after the last, as YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.start >= args.end:
+        parser.error("--start must be before --end")
+
+    asyncio.run(OrderExporter(Settings()).export(args.start, args.end))  # type: ignore
@@ -0,0 +1,120 @@
+import asyncio
+
+import asyncpg
+import redis
+from config.settings import Settings
+from repositories.flash_sale_repository import FlashSaleRepository
+from repositories.item_repository import ItemRepository
+from repositories.job_repository import JobRepository
+from services.flash_sale_service import FlashSaleService
+
+
+class FlashSaleReconciler:
+    def __init__(self, settings: Settings, interval: float = 5.0, batch_size: int = 100):
+        self.settings = settings
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flash_sale_repository = FlashSaleRepository()
+        self.pool = None
+        self.flash_sale_service = None
+        self.reconcile_task = None
+
+    async def release_expired_reservations(self) -> int:
+        service: FlashSaleService = self.flash_sale_service  # type: ignore
+        released = 0
+        held = 0
+
+        async with self.pool.acquire() as conn:  # type: ignore
+            while True:
+                # Reservations still held by a checkout stay in the expiry set, so they are paged past.
+                reservation_ids = self.flash_sale_repository.get_expired_reservations(
+                    start=held, count=self.batch_size, redis=service.redis
+                )
+                if not reservation_ids:
+                    return released
+
+                for reservation_id in reservation_ids:
+                    async with conn.transaction():
+                        outcome = await service.settle_reservation(reservation_id=reservation_id, db=conn)
+
+                    if outcome == "held":
+                        held += 1
+                    elif outcome == "released":
+                        released += 1
+
+    @staticmethod
+    def get_item_reservations(reservations: dict[str, dict[int, int]], item_id: int) -> dict[str, int]:
+        return {reservation_id: qtys[item_id] for reservation_id, qtys in reservations.items() if item_id in qtys}
+
+    async def correct_drift(self) -> None:
+        service: FlashSaleService = self.flash_sale_service  # type: ignore
+        item_ids = self.flash_sale_repository.get_all_flash_sale_items(redis=service.redis)
+
+        if not item_ids:
+            return
+
+        # Postgres is read in one snapshot between two reads of Redis. An item whose stock and reservations did not
+        # change between those reads was seen at one point in time on both sides, so whatever differs is real drift
+        # rather than a checkout or commit job in flight. Items that changed are left for a quieter round.
+        stocks, reservations = self.flash_sale_repository.get_stock(item_ids=item_ids, redis=service.redis)
+        async with self.pool.acquire() as conn:  # type: ignore
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                pending_qtys, committed_reservation_ids = await service.get_pending_qtys(db=conn)
+                items = {
+                    item["id"]: item for item in await service.item_repository.get_items(item_ids=item_ids, db=conn)
+                }
+        stocks_after, reservations_after = self.flash_sale_repository.get_stock(item_ids=item_ids, redis=service.redis)
+
+        for item_id in item_ids:
+            if item_id not in items or item_id not in stocks:
+                continue
+
+            item_reservations = self.get_item_reservations(reservations, item_id)
+            if stocks_after.get(item_id) != stocks[item_id] or (
+                self.get_item_reservations(reservations_after, item_id) != item_reservations
+            ):
+                continue
+
+            # Reservations already turned into a commit job are counted once, through the job.
+            reserved = sum(
+                qty
+                for reservation_id, qty in item_reservations.items()
+                if reservation_id not in committed_reservation_ids
+            )
+            expected = items[item_id]["qty"] - pending_qtys.get(item_id, 0) - reserved
+            drift = expected - stocks[item_id]
+
+            if drift:
+                print(f"Correcting flash sale stock of item {item_id} by {drift}")
+                self.flash_sale_repository.adjust_stock(item_id=item_id, qty=drift, redis=service.redis)
+
+    async def reconcile(self) -> None:
+        # One worker reconciles per round, so corrections are never applied twice.
+        if not self.flash_sale_repository.acquire_reconciler_lock(
+            ttl=self.interval * 0.9, redis=self.flash_sale_service.redis  # type: ignore
+        ):
+            return
+
+        released = await self.release_expired_reservations()
+        if released:
+            print(f"Released {released} expired flash sale reservations")
+        await self.correct_drift()
+
+    async def reconcile_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, redis.RedisError) as exc:
+                print(f"Reconciling flash sales failed: {exc}")
+
+    def setup(self, pool: asyncpg.Pool, redis: redis.Redis) -> None:
+        self.pool = pool
+        self.flash_sale_service = FlashSaleService(
+            FlashSaleRepository(), ItemRepository(), JobRepository(), self.settings, redis
+        )
+        self.reconcile_task = asyncio.create_task(self.reconcile_periodically())
+
+    async def teardown(self) -> None:
+        if self.reconcile_task:
+            self.reconcile_task.cancel()
@@ -0,0 +1,43 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+from models import CatalogVersionModel
+
+
+def get_cache_headers(catalog_version_model: CatalogVersionModel, cache_control: str) -> dict[str, str]:
+    headers = {"ETag": catalog_version_model.etag, "Cache-Control": cache_control}
+
+    if catalog_version_model.last_modified:
+        headers["Last-Modified"] = format_datetime(catalog_version_model.last_modified.astimezone(timezone.utc), True)
+
+    return headers
+
+
+def is_not_modified(request: Request, catalog_version_model: CatalogVersionModel) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        # Compressed variants carry the encoding as an ETag suffix, see CachedResponse.
+        variant_etags = [f'{catalog_version_model.etag[:-1]}-{encoding}"' for encoding in ("gzip", "br", "zstd")]
+        return "*" in etags or any(etag in etags for etag in [catalog_version_model.etag, *variant_etags])
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and catalog_version_model.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        return catalog_version_model.last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def get_not_modified_response(catalog_version_model: CatalogVersionModel, cache_control: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=get_cache_headers(catalog_version_model, cache_control)
+    )
@@ -0,0 +1,155 @@
+import asyncio
+import random
+import time
+
+import asyncpg
+from repositories.job_repository import JobRepository
+
+
+class JobRunner:
+    def __init__(
+        self,
+        workers: int = 2,
+        poll_interval: float = 1.0,
+        stale_timeout: float = 300.0,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 600.0,
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.job_repository = JobRepository()
+        self.handlers = {}
+        self.detached_kinds = set()
+        self.metrics = {}
+        self.pool = None
+        self.tasks = []
+        self.stale_job_task = None
+        self.stopping = False
+
+    def register(self, kind: str, handler, detached: bool = False) -> None:
+        # Detached handlers take only the payload and run outside any transaction, for jobs that may take hours.
+        self.handlers[kind] = handler
+        if detached:
+            self.detached_kinds.add(kind)
+        self.metrics[kind] = {"succeeded": 0, "retried": 0, "failed": 0, "total_duration": 0.0}
+
+    def get_retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * 2 ** (attempts - 1), self.retry_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def record_failure(self, job: asyncpg.Record, exc: Exception, conn: asyncpg.Connection) -> None:
+        metrics = self.metrics[job["kind"]]
+        error = f"{type(exc).__name__}: {exc}"
+        print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {error}")
+
+        if job["attempts"] >= job["max_attempts"]:
+            await self.job_repository.fail_job(job_id=job["id"], error=error, db=conn)
+            metrics["failed"] += 1
+        else:
+            delay = self.get_retry_delay(job["attempts"])
+            await self.job_repository.retry_job(job_id=job["id"], error=error, delay=delay, db=conn)
+            metrics["retried"] += 1
+
+    async def run_job(self, job: asyncpg.Record, conn: asyncpg.Connection) -> None:
+        handler = self.handlers[job["kind"]]
+        metrics = self.metrics[job["kind"]]
+        start = time.perf_counter()
+
+        try:
+            # The handler's writes and the job's removal commit together, so a finished job never runs twice.
+            async with conn.transaction():
+                await handler(job["payload"], conn)
+                await self.job_repository.complete_job(job_id=job["id"], db=conn)
+        except Exception as exc:
+            await self.record_failure(job, exc, conn)
+            return
+        finally:
+            metrics["total_duration"] += time.perf_counter() - start
+
+        metrics["succeeded"] += 1
+
+    async def heartbeat(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self.stale_timeout / 3)
+            try:
+                async with self.pool.acquire() as conn:  # type: ignore
+                    await self.job_repository.touch_job(job_id=job_id, db=conn)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Job {job_id} heartbeat failed: {exc}")
+
+    async def run_detached_job(self, job: asyncpg.Record) -> None:
+        handler = self.handlers[job["kind"]]
+        metrics = self.metrics[job["kind"]]
+        start = time.perf_counter()
+        # Keeps locked_at fresh, so release_stale_jobs leaves the job alone for as long as it really runs.
+        heartbeat_task = asyncio.create_task(self.heartbeat(job["id"]))
+
+        try:
+            await handler(job["payload"])
+        except Exception as exc:
+            async with self.pool.acquire() as conn:  # type: ignore
+                await self.record_failure(job, exc, conn)
+            return
+        finally:
+            heartbeat_task.cancel()
+            metrics["total_duration"] += time.perf_counter() - start
+
+        async with self.pool.acquire() as conn:  # type: ignore
+            await self.job_repository.complete_job(job_id=job["id"], db=conn)
+        metrics["succeeded"] += 1
+
+    async def work(self) -> None:
+        while not self.stopping:
+            try:
+                async with self.pool.acquire() as conn:  # type: ignore
+                    # Only claim kinds this process can run, so mixed versions can share the queue during deploys.
+                    job = await self.job_repository.claim_job(kinds=list(self.handlers), db=conn)
+                    if job and job["kind"] not in self.detached_kinds:
+                        await self.run_job(job, conn)
+
+                if job and job["kind"] in self.detached_kinds:
+                    # Run once the claim's connection is back in the pool, so it is not held for the whole job.
+                    await self.run_detached_job(job)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Job worker error: {exc}")
+                job = None
+
+            if not job:
+                await asyncio.sleep(self.poll_interval)
+
+    async def release_stale_jobs(self) -> None:
+        while not self.stopping:
+            await asyncio.sleep(self.stale_timeout)
+            try:
+                async with self.pool.acquire() as conn:  # type: ignore
+                    await self.job_repository.release_stale_jobs(timeout=self.stale_timeout, db=conn)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Releasing stale jobs failed: {exc}")
+
+    def get_metrics(self) -> dict:
+        job_metrics = {}
+
+        for kind, metrics in self.metrics.items():
+            runs = metrics["succeeded"] + metrics["retried"] + metrics["failed"]
+            job_metrics[kind] = {**metrics, "average_duration": metrics["total_duration"] / runs if runs else 0.0}
+
+        return job_metrics
+
+    async def setup(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.stale_job_task = asyncio.create_task(self.release_stale_jobs())
+
+    async def teardown(self, timeout: float = 10.0) -> None:
+        self.stopping = True
+        if self.stale_job_task:
+            self.stale_job_task.cancel()
+
+        # Workers finish the job in hand; anything still running after the timeout is picked up again as stale.
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
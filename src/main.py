@@ -1,29 +1,188 @@
+from startup import startup_profiler  # imported first so the import phase covers every other module
+
+import asyncio
 import time
 
 import asyncpg
 import jwt
+import redis
+from cart_flusher import CartFlusher
 from config.settings import Settings
+from catalog import CatalogSnapshot, ItemChangeListener, ItemNameIndex
+from change_feed import ItemChangeFeed
+from export_orders import OrderExporter
 from fastapi import FastAPI, Request, status
 from fastapi.concurrency import asynccontextmanager
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from routers import auth_router, cart_router, item_router, order_router, user_router
+from flash_sale_reconciler import FlashSaleReconciler
+from jobs import JobRunner
+from openapi_cache import use_cached_openapi
+from order_partitions import OrderPartitionMaintainer
+from repositories.analytics_repository import AnalyticsRepository
+from repositories.flash_sale_repository import FlashSaleRepository
+from repositories.item_repository import ItemRepository
+from repositories.job_repository import JobRepository
+from repositories.order_repository import OrderRepository
+from rating_buffer import RatingBuffer
+from response_cache import ResponseCache
+from revocation_cache import RevocationCache
+from routers import admin_router, analytics_router, auth_router, cart_router, item_router, order_router, user_router
+from services.analytics_service import AnalyticsService
+from services.flash_sale_service import FlashSaleService
+from services.order_service import OrderService
+from single_flight import SingleFlight
+from slow_query_log import SlowQueryLog
 from states import PostgresClient, RedisClient
+from tracing import Tracer
+
+startup_profiler.mark("import")
+
+
+async def warm_up(app: FastAPI):
+    try:
+        with startup_profiler.phase("warm_up"):
+            await startup_profiler.run("item_change_listener", app.state.item_change_listener.setup())
+            tasks = [
+                startup_profiler.run(
+                    "postgres_pool",
+                    app.state.postgres_client.warm_up(
+                        app.state.settings.POSTGRES_WARM_CONNECTIONS, ItemRepository().warm_up
+                    ),
+                ),
+                startup_profiler.run("redis", app.state.redis_client.warm_up()),
+                startup_profiler.run(
+                    "item_name_index",
+                    app.state.item_name_index.setup(app.state.postgres_client.pool, app.state.item_change_listener),
+                ),
+            ]
+            if app.state.catalog_snapshot:
+                tasks.append(
+                    startup_profiler.run(
+                        "catalog_snapshot", app.state.catalog_snapshot.setup(app.state.postgres_client.pool)
+                    )
+                )
+            await asyncio.gather(*tasks)
+    except Exception as exc:
+        # Left unready, so the readiness probe fails and the orchestrator replaces this instance.
+        print(f"Warm-up failed: {type(exc).__name__}: {exc}")
+        return
+
+    app.state.ready = True
+    startup_profiler.finish()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting up application")
-    app.state.settings = Settings()  # type: ignore
-    app.state.postgres_client = PostgresClient(app.state.settings.POSTGRES_URL)
+    app.state.ready = False
+    with startup_profiler.phase("settings"):
+        app.state.settings = Settings()  # type: ignore
+    app.state.postgres_client = PostgresClient(
+        app.state.settings.POSTGRES_URL,
+        app.state.settings.POSTGRES_REPLICA_URLS,
+        app.state.settings.POSTGRES_REPLICA_MAX_LAG,
+        app.state.settings.POSTGRES_REPLICA_LAG_CHECK_INTERVAL,
+        app.state.settings.POSTGRES_MAX_CONNECTIONS,
+        app.state.settings.WEB_CONCURRENCY,
+    )
     app.state.redis_client = RedisClient(
-        app.state.settings.REDIS_HOST, app.state.settings.REDIS_PORT, app.state.settings.REDIS_PWD
+        app.state.settings.REDIS_HOST,
+        app.state.settings.REDIS_PORT,
+        app.state.settings.REDIS_PWD,
+        app.state.settings.REDIS_SOCKET_TIMEOUT,
+        app.state.settings.REDIS_CONNECT_TIMEOUT,
+        app.state.settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+        app.state.settings.REDIS_BREAKER_RESET_TIMEOUT,
+    )
+    app.state.revocation_cache = RevocationCache(app.state.settings.REVOCATION_CACHE_REFRESH_INTERVAL)
+    app.state.item_change_listener = ItemChangeListener(
+        app.state.settings.POSTGRES_URL, app.state.settings.ITEM_CHANGE_HEARTBEAT_INTERVAL
+    )
+    app.state.item_change_feed = ItemChangeFeed(
+        app.state.settings.CHANGE_FEED_MAX_SUBSCRIBERS,
+        app.state.settings.CHANGE_FEED_MAX_PENDING,
+        app.state.settings.CHANGE_FEED_COALESCE_INTERVAL,
+        app.state.settings.CHANGE_FEED_HEARTBEAT_INTERVAL,
+        app.state.settings.CHANGE_FEED_MAX_DURATION,
+    )
+    app.state.item_change_feed.setup(app.state.item_change_listener)
+    app.state.item_name_index = ItemNameIndex(app.state.settings.ITEM_NAME_INDEX_REFRESH_INTERVAL)
+    app.state.response_cache = ResponseCache(app.state.settings.RESPONSE_CACHE_MAX_BYTES)
+    app.state.item_single_flight = SingleFlight()
+    app.state.slow_query_log = SlowQueryLog(
+        app.state.settings.SLOW_QUERY_THRESHOLD,
+        app.state.settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        app.state.settings.SLOW_QUERY_MAX_STATEMENTS,
+    )
+    app.state.tracer = Tracer(
+        app.state.settings.TRACE_SAMPLE_RATE,
+        app.state.settings.TRACE_BUFFER_SIZE,
+        app.state.settings.TRACE_EXPORT_PATH,
+        app.state.settings.TRACE_SERVICE_NAME,
+    )
+    app.state.rating_buffer = RatingBuffer(
+        app.state.settings.RATING_BATCH_SIZE,
+        app.state.settings.RATING_FLUSH_INTERVAL,
+        app.state.settings.RATING_BUFFER_MAX_DEPTH,
+    )
+    app.state.job_runner = JobRunner(
+        app.state.settings.JOB_WORKERS, app.state.settings.JOB_POLL_INTERVAL, app.state.settings.JOB_STALE_TIMEOUT
+    )
+    app.state.job_runner.register("order_placed", OrderService(OrderRepository()).send_order_confirmation)
+    app.state.job_runner.register(
+        "update_sales_rollups", AnalyticsService(AnalyticsRepository(), OrderRepository()).update_sales_rollups
+    )
+    app.state.order_exporter = OrderExporter(app.state.settings)
+    app.state.job_runner.register("export_orders", app.state.order_exporter.export_job, detached=True)
+    app.state.order_partition_maintainer = OrderPartitionMaintainer(app.state.settings.ORDER_PARTITION_MONTHS_AHEAD)
+    app.state.flash_sale_reconciler = FlashSaleReconciler(
+        app.state.settings, app.state.settings.FLASH_SALE_RECONCILE_INTERVAL
     )
+    app.state.cart_flusher = None
+    if app.state.settings.CART_STORAGE == "redis":
+        app.state.cart_flusher = CartFlusher(app.state.settings.CART_FLUSH_INTERVAL)
+    app.state.catalog_snapshot = None
+    if app.state.settings.CATALOG_SNAPSHOT_ENABLED:
+        app.state.catalog_snapshot = CatalogSnapshot(
+            app.state.item_change_listener, app.state.settings.CATALOG_MAX_STALENESS
+        )
 
-    await app.state.postgres_client.setup()
+    if app.state.settings.OPENAPI_CACHE_PATH:
+        use_cached_openapi(app, app.state.settings.OPENAPI_CACHE_PATH)
+
+    with startup_profiler.phase("postgres"):
+        await app.state.postgres_client.setup()
+    await app.state.order_partition_maintainer.setup(app.state.postgres_client.pool)
+    app.state.rating_buffer.setup(app.state.postgres_client.pool)
     app.state.redis_client.setup()
+    app.state.revocation_cache.setup(app.state.redis_client.redis)
+    app.state.job_runner.register(
+        "commit_flash_sale",
+        FlashSaleService(
+            FlashSaleRepository(), ItemRepository(), JobRepository(), app.state.settings, app.state.redis_client.redis
+        ).commit_flash_sale,
+    )
+    app.state.flash_sale_reconciler.setup(app.state.postgres_client.pool, app.state.redis_client.redis)
+    if app.state.cart_flusher:
+        app.state.cart_flusher.setup(app.state.postgres_client.pool, app.state.redis_client.redis)
+    await app.state.job_runner.setup(app.state.postgres_client.pool)
+    # /ping answers as soon as the pool exists; /ready waits for the caches and warm connections.
+    warm_up_task = asyncio.create_task(warm_up(app))
     yield
+    app.state.ready = False
+    warm_up_task.cancel()
+    await app.state.job_runner.teardown()
+    await app.state.order_partition_maintainer.teardown()
+    await app.state.flash_sale_reconciler.teardown()
+    await app.state.rating_buffer.teardown()
+    if app.state.cart_flusher:
+        await app.state.cart_flusher.teardown()
+    app.state.item_change_feed.teardown()
+    await app.state.item_change_listener.teardown()
+    await app.state.item_name_index.teardown()
     await app.state.postgres_client.teardown()
+    app.state.revocation_cache.teardown()
     app.state.redis_client.teardown()
     print("Shutting down applicaiton")
 
@@ -46,6 +205,16 @@ async def postgrss_exception_handler(request: Request, exc: asyncpg.PostgresErro
     return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"detail": str(exc)})
 
 
+@app.exception_handler(redis.ConnectionError)
+@app.exception_handler(redis.TimeoutError)
+async def redis_exception_handler(request: Request, exc: redis.RedisError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service temporarily unavailable."},
+        headers={"Retry-After": str(int(request.app.state.settings.REDIS_BREAKER_RESET_TIMEOUT))},
+    )
+
+
 @app.exception_handler(Exception)
 async def exception_handler(request: Request, exc: Exception):
     return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"detail": str(exc)})
@@ -61,13 +230,39 @@ async def response_time_tracker(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def request_tracer(request: Request, call_next):
+    tracer = request.app.state.tracer
+    with tracer.start_trace(
+        f"{request.method} {request.url.path}", **{"http.method": request.method, "http.target": request.url.path}
+    ) as root_span:
+        response = await call_next(request)
+
+    if root_span:
+        root_span.attributes["http.status_code"] = response.status_code
+        route = request.scope.get("route")
+        if route:
+            root_span.name = f"{request.method} {route.path}"
+        await tracer.export(root_span.trace)
+
+    return response
+
+
 app.include_router(auth_router.router)
 app.include_router(user_router.router)
 app.include_router(item_router.router)
 app.include_router(cart_router.router)
 app.include_router(order_router.router)
+app.include_router(admin_router.router)
+app.include_router(analytics_router.router)
 
 
 @app.get("/ping", tags=["Health"], summary="Check server is running")
 async def ping():
     return {"response": "pong"}
+
+
+@app.get("/ready", tags=["Health"], summary="Check server is ready for traffic")
+async def ready(request: Request):
+    status_code = status.HTTP_200_OK if request.app.state.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=startup_profiler.get_report())
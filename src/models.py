@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AccessTokenModel(BaseModel):
@@ -36,6 +36,11 @@ class ItemModel(BaseModel):
     qty: int
 
 
+class CatalogVersionModel(BaseModel):
+    etag: str
+    last_modified: datetime | None
+
+
 class ItemRegistrationModel(BaseModel):
     name: str
     price: float
@@ -68,9 +73,17 @@ class PaymentDetailRegistrationModel(BaseModel):
     cvv: str
 
 
+class PaymentProfileModel(BaseModel):
+    id: int
+    last_four: str
+
+
 class OrderRegistrationModel(BaseModel):
-    shipping_detail_registration_model: ShippingDetailRegistrationModel
-    payment_detail_registration_model: PaymentDetailRegistrationModel
+    # Either a saved detail id or new details to save, for each of shipping and payment.
+    shipping_detail_id: int | None = None
+    payment_detail_id: int | None = None
+    shipping_detail_registration_model: ShippingDetailRegistrationModel | None = None
+    payment_detail_registration_model: PaymentDetailRegistrationModel | None = None
 
 
 class OrderModel(BaseModel):
@@ -93,6 +106,32 @@ class OrderSummaryModel(BaseModel):
     order_model: OrderModel
 
 
-class ItemRatingModel(BaseModel):
+class TopSellerModel(BaseModel):
     item_id: int
+    name: str
+    category: str
+    units: int
+    revenue: float
+
+
+class CategoryRevenueModel(BaseModel):
+    day: date
+    category: str
+    units: int
+    revenue: float
+
+
+class LowStockItemModel(BaseModel):
+    id: int
+    name: str
+    category: str
+    qty: int
+    daily_units: float
+    days_left: float | None
+
+
+class ItemRatingModel(BaseModel):
+    # Bounded to what item_ratings.item_id accepts, as ratings are only written later, in batches. The rating itself
+    # is checked by the route, which answers out-of-range ratings with a 400.
+    item_id: int = Field(ge=1, le=2**31 - 1)
     rating: int
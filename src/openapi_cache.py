@@ -0,0 +1,33 @@
+import json
+import sys
+
+from fastapi import FastAPI
+
+
+def write_openapi(app: FastAPI, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(app.openapi(), f, separators=(",", ":"))
+
+
+def use_cached_openapi(app: FastAPI, path: str) -> None:
+    generate_openapi = app.openapi
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            try:
+                with open(path) as f:
+                    app.openapi_schema = json.load(f)
+            except (OSError, ValueError):
+                print(f"OpenAPI cache {path} is unusable, generating the schema")
+                app.openapi_schema = generate_openapi()
+
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+if __name__ == "__main__":
+    # Run at image build time, so workers never pay for schema generation.
+    from main import app
+
+    write_openapi(app, sys.argv[1] if len(sys.argv) > 1 else "openapi.json")
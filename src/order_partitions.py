@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime, timezone
+
+import asyncpg
+from repositories.order_repository import OrderRepository
+
+
+class OrderPartitionMaintainer:
+    def __init__(self, months_ahead: int = 3, interval: float = 24 * 3600):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.order_repository = OrderRepository()
+        self.pool = None
+        self.maintain_task = None
+
+    async def create_partitions(self) -> None:
+        async with self.pool.acquire() as conn:  # type: ignore
+            await self.order_repository.create_order_partitions(
+                start_month=datetime.now(timezone.utc).date(), months=self.months_ahead + 1, db=conn
+            )
+
+    async def maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.create_partitions()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                print(f"Creating order partitions failed: {exc}")
+
+    async def setup(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        await self.create_partitions()
+        self.maintain_task = asyncio.create_task(self.maintain())
+
+    async def teardown(self) -> None:
+        if self.maintain_task:
+            self.maintain_task.cancel()
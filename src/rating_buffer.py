@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import asyncpg
+from repositories.item_repository import ItemRepository
+
+# Errors that say Postgres could not take the batch right now, rather than that the batch itself is bad.
+transient_errors = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InsufficientResourcesError,
+    asyncpg.OperatorInterventionError,
+    asyncpg.TransactionRollbackError,
+)
+
+
+class RatingBuffer:
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_depth: int = 50_000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.item_repository = ItemRepository()
+        self.ratings: list[tuple[int, int]] = []
+        self.batch_ready = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.metrics = {
+            "accepted": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "unknown_items": 0,
+            "batches": 0,
+            "failures": 0,
+            "dropped": 0,
+            "total_flush_time": 0.0,
+            "max_flush_time": 0.0,
+        }
+        self.pool = None
+        self.flush_task = None
+        self.stopping = False
+
+    def add(self, item_id: int, rating: int) -> bool:
+        # Past max_depth Postgres is not keeping up, so callers are turned away rather than growing memory.
+        if len(self.ratings) >= self.max_depth:
+            self.metrics["rejected"] += 1
+            return False
+
+        self.ratings.append((item_id, rating))
+        self.metrics["accepted"] += 1
+        if len(self.ratings) >= self.batch_size:
+            self.batch_ready.set()
+
+        return True
+
+    async def flush_batch(self, ratings: list[tuple[int, int]]) -> None:
+        start = time.perf_counter()
+
+        async with self.pool.acquire() as conn:  # type: ignore
+            async with conn.transaction():
+                # Locked so none of the items can be deleted between the check and the copy.
+                item_ids = await self.item_repository.lock_existing_items(
+                    item_ids=list({item_id for item_id, _ in ratings}), db=conn
+                )
+                known_ratings = [(item_id, rating) for item_id, rating in ratings if item_id in item_ids]
+                if known_ratings:
+                    await self.item_repository.register_item_ratings(ratings=known_ratings, db=conn)
+
+        flush_time = time.perf_counter() - start
+        self.metrics["flushed"] += len(known_ratings)
+        self.metrics["unknown_items"] += len(ratings) - len(known_ratings)
+        self.metrics["batches"] += 1
+        self.metrics["total_flush_time"] += flush_time
+        self.metrics["max_flush_time"] = max(self.metrics["max_flush_time"], flush_time)
+
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            while self.ratings:
+                ratings, self.ratings = self.ratings[: self.batch_size], self.ratings[self.batch_size :]
+                try:
+                    await self.flush_batch(ratings)
+                except transient_errors as exc:
+                    print(f"Flushing ratings failed: {exc}")
+                    self.metrics["failures"] += 1
+                    self.ratings = ratings + self.ratings
+                    return
+                except (asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                    # The same batch would fail on every retry and hold up everything behind it, so it is dropped.
+                    print(f"Dropping {len(ratings)} ratings that cannot be written ({exc}): {ratings}")
+                    self.metrics["failures"] += 1
+                    self.metrics["dropped"] += len(ratings)
+
+    async def flush_periodically(self) -> None:
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.batch_ready.clear()
+            await self.flush()
+
+    def setup(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+        self.flush_task = asyncio.create_task(self.flush_periodically())
+
+    async def teardown(self) -> None:
+        # The flush loop is stopped rather than cancelled, so a batch is never abandoned halfway through its copy.
+        self.stopping = True
+        self.batch_ready.set()
+        if self.flush_task:
+            await self.flush_task
+
+        # Everything accepted so far is written out before the pool closes.
+        await self.flush()
+        if self.ratings:
+            print(f"Dropping {len(self.ratings)} ratings that could not be flushed")
+
+    def get_metrics(self) -> dict:
+        return {
+            "depth": len(self.ratings),
+            "average_flush_time": self.metrics["total_flush_time"] / max(1, self.metrics["batches"]),
+            **self.metrics,
+        }
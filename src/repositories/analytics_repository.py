@@ -0,0 +1,83 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import asyncpg
+
+
+class AnalyticsRepository:
+    async def add_item_sales(
+        self,
+        order_date: datetime,
+        item_ids: list[int],
+        units: list[int],
+        revenues: list[Decimal],
+        db: asyncpg.Connection,
+    ) -> None:
+        query = """
+            insert into item_sales_daily(day, item_id, units, revenue)
+            select ($1 at time zone 'UTC')::date, s.item_id, s.units, s.revenue
+            from unnest($2::int[], $3::int[], $4::numeric[]) as s(item_id, units, revenue)
+            join items i on s.item_id = i.id
+            on conflict (day, item_id) do update
+            set units = item_sales_daily.units + excluded.units, revenue = item_sales_daily.revenue + excluded.revenue;
+        """
+        await db.execute(query, order_date, item_ids, units, revenues)
+
+    async def add_category_sales(
+        self,
+        order_date: datetime,
+        categories: list[str],
+        units: list[int],
+        revenues: list[Decimal],
+        db: asyncpg.Connection,
+    ) -> None:
+        query = """
+            insert into category_sales_daily(day, category, units, revenue)
+            select ($1 at time zone 'UTC')::date, s.category, sum(s.units), sum(s.revenue)
+            from unnest($2::varchar[], $3::int[], $4::numeric[]) as s(category, units, revenue)
+            group by s.category
+            on conflict (day, category) do update
+            set units = category_sales_daily.units + excluded.units,
+                revenue = category_sales_daily.revenue + excluded.revenue;
+        """
+        await db.execute(query, order_date, categories, units, revenues)
+
+    async def get_top_sellers(
+        self, since: date, until: date, order_by: str, limit: int, db: asyncpg.Connection
+    ) -> list[asyncpg.Record]:
+        query = f"""
+            select s.item_id, i.name, i.category, sum(s.units) as units, sum(s.revenue) as revenue
+            from item_sales_daily s
+            join items i on s.item_id = i.id
+            where s.day between $1 and $2
+            group by s.item_id, i.name, i.category
+            order by {"revenue" if order_by == "revenue" else "units"} desc
+            limit $3;
+        """
+        top_sellers = await db.fetch(query, since, until, limit)
+        return top_sellers
+
+    async def get_category_revenue(
+        self, since: date, until: date, category: str | None, db: asyncpg.Connection
+    ) -> list[asyncpg.Record]:
+        query = """
+            select day, category, units, revenue from category_sales_daily
+            where day between $1 and $2 and ($3::varchar is null or category = $3)
+            order by day, category;
+        """
+        category_revenue = await db.fetch(query, since, until, category)
+        return category_revenue
+
+    async def get_low_stock_items(
+        self, threshold: int, since: date, days: int, db: asyncpg.Connection
+    ) -> list[asyncpg.Record]:
+        query = """
+            select i.id, i.name, i.category, i.qty, coalesce(sum(s.units), 0)::float / $3 as daily_units
+            from items i
+            left join item_sales_daily s on s.item_id = i.id and s.day >= $2
+            where i.qty <= $1
+            group by i.id
+            order by i.qty;
+        """
+        low_stock_items = await db.fetch(query, threshold, since, days)
+        return low_stock_items
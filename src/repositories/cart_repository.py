@@ -72,3 +72,25 @@ class CartRepository:
         """
         total = await db.fetchrow(query, user_id)
         return total
+
+    async def get_cart_qtys(self, user_id: int, db: asyncpg.Connection) -> dict[int, int]:
+        query = """
+            select item_id, qty from carts
+            where user_id = $1;
+        """
+        cart = await db.fetch(query, user_id)
+        return {item["item_id"]: item["qty"] for item in cart}
+
+    async def replace_cart(self, user_id: int, qtys: dict[int, int], db: asyncpg.Connection) -> None:
+        delete_query = """
+            delete from carts
+            where user_id = $1;
+        """
+        # Items deleted since they were put in the cart are dropped instead of failing the foreign key.
+        insert_query = """
+            insert into carts(item_id, qty, user_id)
+            select c.item_id, c.qty, $1 from unnest($2::int[], $3::int[]) as c(item_id, qty)
+            join items i on c.item_id = i.id;
+        """
+        await db.execute(delete_query, user_id)
+        await db.execute(insert_query, user_id, list(qtys), list(qtys.values()))
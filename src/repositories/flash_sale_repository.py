@@ -0,0 +1,144 @@
+import json
+import time
+
+import asyncpg
+import redis
+
+# Items on flash sale are kept in a set, each with a stock counter that checkouts reserve from atomically.
+# Reservations live in a hash (id to item quantities) plus a sorted set by expiry, until confirmed or released.
+flash_sale_items_key = "flash_sale:items"
+stock_key_prefix = "flash_sale:stock:"
+reservations_key = "flash_sale:reservations"
+reservation_expiry_key = "flash_sale:reservation_expiry"
+
+# First key of the two-key advisory locks a checkout holds on its reservation until its transaction ends.
+reservation_lock_namespace = 739_120_455
+
+reserve_stock_script = """
+    local count = #KEYS - 2
+    for i = 1, count do
+        local stock = tonumber(redis.call('get', KEYS[i]))
+        if stock == nil then
+            return {i, -1}
+        end
+        if stock < tonumber(ARGV[i + 3]) then
+            return {i, stock}
+        end
+    end
+    for i = 1, count do
+        redis.call('decrby', KEYS[i], ARGV[i + 3])
+    end
+    redis.call('hset', KEYS[count + 1], ARGV[1], ARGV[3])
+    redis.call('zadd', KEYS[count + 2], ARGV[2], ARGV[1])
+    return {0, 0}
+"""
+
+release_reservation_script = """
+    local reservation = redis.call('hget', KEYS[1], ARGV[1])
+    if not reservation then
+        return 0
+    end
+    for item_id, qty in pairs(cjson.decode(reservation)) do
+        local key = ARGV[2] .. item_id
+        if redis.call('exists', key) == 1 then
+            redis.call('incrby', key, qty)
+        end
+    end
+    redis.call('hdel', KEYS[1], ARGV[1])
+    redis.call('zrem', KEYS[2], ARGV[1])
+    return 1
+"""
+
+
+class FlashSaleRepository:
+    @staticmethod
+    def get_stock_key(item_id: int) -> str:
+        return f"{stock_key_prefix}{item_id}"
+
+    def start_flash_sale(self, item_id: int, stock: int, redis: redis.Redis) -> bool:
+        pipeline = redis.pipeline()
+        pipeline.set(self.get_stock_key(item_id), stock, nx=True)
+        pipeline.sadd(flash_sale_items_key, item_id)
+        started, _ = pipeline.execute()
+        return bool(started)
+
+    def end_flash_sale(self, item_id: int, redis: redis.Redis) -> bool:
+        pipeline = redis.pipeline()
+        pipeline.srem(flash_sale_items_key, item_id)
+        pipeline.delete(self.get_stock_key(item_id))
+        removed, _ = pipeline.execute()
+        return bool(removed)
+
+    def get_flash_sale_items(self, item_ids: list[int], redis: redis.Redis) -> list[int]:
+        if not item_ids:
+            return []
+
+        flags = redis.smismember(flash_sale_items_key, item_ids)  # type: ignore
+        return [item_id for item_id, flag in zip(item_ids, flags) if flag]
+
+    def get_all_flash_sale_items(self, redis: redis.Redis) -> list[int]:
+        return sorted(int(item_id) for item_id in redis.smembers(flash_sale_items_key))  # type: ignore
+
+    def reserve_stock(
+        self, reservation_id: str, qtys: dict[int, int], ttl: int, redis: redis.Redis
+    ) -> tuple[int, int] | None:
+        item_ids = list(qtys)
+        keys = [self.get_stock_key(item_id) for item_id in item_ids] + [reservations_key, reservation_expiry_key]
+        args = [reservation_id, time.time() + ttl, json.dumps(qtys)] + [qtys[item_id] for item_id in item_ids]
+        index, stock = redis.register_script(reserve_stock_script)(keys=keys, args=args)  # type: ignore
+
+        if index == 0:
+            return None
+
+        return item_ids[index - 1], stock
+
+    def has_reservation(self, reservation_id: str, redis: redis.Redis) -> bool:
+        return bool(redis.hexists(reservations_key, reservation_id))
+
+    async def lock_reservation(self, reservation_id: str, db: asyncpg.Connection) -> None:
+        query = """
+            select pg_advisory_xact_lock($1, hashtext($2));
+        """
+        await db.execute(query, reservation_lock_namespace, reservation_id)
+
+    async def try_lock_reservation(self, reservation_id: str, db: asyncpg.Connection) -> bool:
+        query = """
+            select pg_try_advisory_xact_lock($1, hashtext($2));
+        """
+        return await db.fetchval(query, reservation_lock_namespace, reservation_id)
+
+    def confirm_reservation(self, reservation_id: str, redis: redis.Redis) -> bool:
+        pipeline = redis.pipeline()
+        pipeline.hdel(reservations_key, reservation_id)
+        pipeline.zrem(reservation_expiry_key, reservation_id)
+        confirmed, _ = pipeline.execute()
+        return bool(confirmed)
+
+    def release_reservation(self, reservation_id: str, redis: redis.Redis) -> bool:
+        script = redis.register_script(release_reservation_script)
+        return bool(script(keys=[reservations_key, reservation_expiry_key], args=[reservation_id, stock_key_prefix]))
+
+    def get_expired_reservations(self, start: int, count: int, redis: redis.Redis) -> list[str]:
+        return redis.zrangebyscore(reservation_expiry_key, "-inf", time.time(), start=start, num=count)  # type: ignore
+
+    def get_stock(self, item_ids: list[int], redis: redis.Redis) -> tuple[dict[int, int], dict[str, dict[int, int]]]:
+        # Read in one MULTI so the counters and the reservations taken from them are consistent with each other.
+        pipeline = redis.pipeline()
+        for item_id in item_ids:
+            pipeline.get(self.get_stock_key(item_id))
+        pipeline.hgetall(reservations_key)
+        *stocks, reservations = pipeline.execute()
+
+        return (
+            {item_id: int(stock) for item_id, stock in zip(item_ids, stocks) if stock is not None},
+            {
+                reservation_id: {int(item_id): qty for item_id, qty in json.loads(items).items()}
+                for reservation_id, items in reservations.items()
+            },
+        )
+
+    def adjust_stock(self, item_id: int, qty: int, redis: redis.Redis) -> None:
+        redis.incrby(self.get_stock_key(item_id), qty)
+
+    def acquire_reconciler_lock(self, ttl: float, redis: redis.Redis) -> bool:
+        return bool(redis.set("flash_sale:reconciler_lock", 1, nx=True, px=int(ttl * 1000)))
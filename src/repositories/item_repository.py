@@ -20,21 +20,32 @@ class ItemRepository:
         item = await db.fetchrow(query, item_id)
         return item
 
+    async def get_items(self, item_ids: list[int], db: asyncpg.Connection) -> list[asyncpg.Record]:
+        query = """
+            select * from items
+            where id = any($1::int[]);
+        """
+        items = await db.fetch(query, item_ids)
+        return items
+
     async def increase_qty(self, item_id: int, qty: int, db: asyncpg.Connection) -> None:
         query = """
             update items
-            set qty = qty + $1
-            where id = $2
+            set qty = qty + $1, version = nextval('item_versions'), updated_at = clock_timestamp()
+            where id = $2;
         """
         await db.execute(query, qty, item_id)
 
-    async def decrease_qty(self, item_id: int, qty: int, db: asyncpg.Connection) -> None:
+    async def decrease_qty(self, item_id: int, qty: int, db: asyncpg.Connection) -> bool:
+        # Never takes stock below zero; False tells the caller there was not enough left.
         query = """
             update items
-            set qty = qty - $1
-            where id = $2;
+            set qty = qty - $1, version = nextval('item_versions'), updated_at = clock_timestamp()
+            where id = $2 and qty >= $1
+            returning id;
         """
-        await db.execute(query, qty, item_id)
+        item_id = await db.fetchval(query, qty, item_id)
+        return item_id is not None
 
     async def remove_item(self, item_id: int, db: asyncpg.Connection) -> None:
         query = """
@@ -57,12 +68,72 @@ class ItemRepository:
         items = await db.fetch(query, category)
         return items
 
-    async def register_item_rating(self, item_id: int, rating: int, db: asyncpg.Connection) -> None:
+    async def get_item_version(self, item_id: int, db: asyncpg.Connection) -> asyncpg.Record | None:
         query = """
-            insert into item_ratings(item_id, rating) values
-            ($1, $2);
+            select version, updated_at from items
+            where id = $1;
+        """
+        item_version = await db.fetchrow(query, item_id)
+        return item_version
+
+    async def get_catalog_version(self, db: asyncpg.Connection) -> asyncpg.Record:
+        query = """
+            select count(*) as count, coalesce(sum(('x' || left(md5(id || ':' || version), 15))::bit(60)::bigint), 0)
+                as version
+            from items;
         """
-        await db.execute(query, item_id, rating)
+        catalog_version = await db.fetchrow(query)
+        return catalog_version  # type: ignore
+
+    async def get_category_version(self, category: str, db: asyncpg.Connection) -> asyncpg.Record:
+        query = """
+            select count(*) as count, coalesce(sum(('x' || left(md5(id || ':' || version), 15))::bit(60)::bigint), 0)
+                as version
+            from items
+            where category = $1;
+        """
+        category_version = await db.fetchrow(query, category)
+        return category_version  # type: ignore
+
+    async def search_items(self, keyword: str, limit: int, offset: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
+        query = """
+            select *,
+                ts_rank(to_tsvector('simple', name || ' ' || category), websearch_to_tsquery('simple', $1))
+                    + greatest(similarity(name, $1), similarity(category, $1)) as rank
+            from items
+            where to_tsvector('simple', name || ' ' || category) @@ websearch_to_tsquery('simple', $1)
+                or name % $1
+                or category % $1
+            order by rank desc, id
+            limit $2 offset $3;
+        """
+        items = await db.fetch(query, keyword, limit, offset)
+        return items
+
+    async def warm_up(self, db: asyncpg.Connection) -> None:
+        # Runs the hot lookups once so their statements are already prepared on this connection.
+        await self.get_item(item_id=0, db=db)
+        await self.get_items(item_ids=[0], db=db)
+        await self.get_item_version(item_id=0, db=db)
+        await self.get_category_version(category="", db=db)
+
+    async def get_item_names(self, db: asyncpg.Connection) -> list[str]:
+        query = """
+            select name from items;
+        """
+        items = await db.fetch(query)
+        return [item["name"] for item in items]
+
+    async def lock_existing_items(self, item_ids: list[int], db: asyncpg.Connection) -> set[int]:
+        query = """
+            select id from items where id = any($1::int[])
+            for key share;
+        """
+        items = await db.fetch(query, item_ids)
+        return {item["id"] for item in items}
+
+    async def register_item_ratings(self, ratings: list[tuple[int, int]], db: asyncpg.Connection) -> None:
+        await db.copy_records_to_table("item_ratings", records=ratings, columns=["item_id", "rating"])
 
     async def get_item_ratings(self, item_id: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
         query = """
@@ -0,0 +1,86 @@
+import asyncpg
+
+
+class JobRepository:
+    async def enqueue(self, kind: str, payload: dict, delay: float, max_attempts: int, db: asyncpg.Connection) -> None:
+        query = """
+            insert into jobs(kind, payload, run_at, max_attempts) values
+            ($1, $2, current_timestamp + make_interval(secs => $3), $4);
+        """
+        await db.execute(query, kind, payload, delay, max_attempts)
+
+    async def claim_job(self, kinds: list[str], db: asyncpg.Connection) -> asyncpg.Record | None:
+        query = """
+            update jobs
+            set status = 'running', attempts = attempts + 1, locked_at = current_timestamp
+            where id = (
+                select id from jobs
+                where status = 'pending' and run_at <= current_timestamp and kind = any($1::varchar[])
+                order by run_at
+                limit 1
+                for update skip locked
+            )
+            returning *;
+        """
+        job = await db.fetchrow(query, kinds)
+        return job
+
+    async def complete_job(self, job_id: int, db: asyncpg.Connection) -> None:
+        query = """
+            delete from jobs where id = $1;
+        """
+        await db.execute(query, job_id)
+
+    async def retry_job(self, job_id: int, error: str, delay: float, db: asyncpg.Connection) -> None:
+        query = """
+            update jobs
+            set status = 'pending', locked_at = null, last_error = $2,
+                run_at = current_timestamp + make_interval(secs => $3)
+            where id = $1;
+        """
+        await db.execute(query, job_id, error, delay)
+
+    async def fail_job(self, job_id: int, error: str, db: asyncpg.Connection) -> None:
+        query = """
+            update jobs
+            set status = 'failed', locked_at = null, last_error = $2
+            where id = $1;
+        """
+        await db.execute(query, job_id, error)
+
+    async def touch_job(self, job_id: int, db: asyncpg.Connection) -> None:
+        query = """
+            update jobs set locked_at = current_timestamp
+            where id = $1 and status = 'running';
+        """
+        await db.execute(query, job_id)
+
+    async def release_stale_jobs(self, timeout: float, db: asyncpg.Connection) -> None:
+        query = """
+            update jobs
+            set status = 'pending', locked_at = null
+            where status = 'running' and locked_at < current_timestamp - make_interval(secs => $1);
+        """
+        await db.execute(query, timeout)
+
+    async def get_job_counts(self, db: asyncpg.Connection) -> list[asyncpg.Record]:
+        query = """
+            select kind, status, count(*) as count from jobs
+            group by kind, status;
+        """
+        job_counts = await db.fetch(query)
+        return job_counts
+
+    async def has_job(self, kind: str, payload: dict, db: asyncpg.Connection) -> bool:
+        # Any job of this kind whose payload contains the given fields, whatever its status.
+        query = """
+            select exists(select 1 from jobs where kind = $1 and payload @> $2);
+        """
+        return await db.fetchval(query, kind, payload)
+
+    async def get_job_payloads(self, kind: str, db: asyncpg.Connection) -> list[dict]:
+        query = """
+            select payload from jobs where kind = $1;
+        """
+        jobs = await db.fetch(query, kind)
+        return [job["payload"] for job in jobs]
@@ -1,68 +1,203 @@
+from datetime import date, datetime
+
 import asyncpg
 
 
 class OrderRepository:
-    async def register_shipping_detail(self, address: str, db: asyncpg.Connection) -> asyncpg.Record:
+    async def register_shipping_detail(self, user_id: int, address: str, db: asyncpg.Connection) -> asyncpg.Record:
+        # Details already saved are returned as they are, never rewritten, as past orders show them.
+        while True:
+            query = """
+                insert into shipping_details(user_id, address, detail_hash) values
+                ($1, $2, shipping_detail_hash($2))
+                on conflict (user_id, detail_hash) where archived_at is null do nothing
+                returning *;
+            """
+            shipping_detail = await db.fetchrow(query, user_id, address)
+            if shipping_detail:
+                return shipping_detail
+
+            # Read in a statement of its own, so a row saved by a concurrent request is visible.
+            query = """
+                select * from shipping_details
+                where user_id = $1 and detail_hash = shipping_detail_hash($2) and archived_at is null;
+            """
+            shipping_detail = await db.fetchrow(query, user_id, address)
+            if shipping_detail:
+                return shipping_detail
+
+    async def register_payment_detail(
+        self, user_id: int, card_number: str, cvv: str, db: asyncpg.Connection
+    ) -> asyncpg.Record:
+        while True:
+            query = """
+                insert into payment_details(user_id, card_number, cvv, detail_hash) values
+                ($1, $2, $3, payment_detail_hash($2, $3))
+                on conflict (user_id, detail_hash) where archived_at is null do nothing
+                returning *;
+            """
+            payment_detail = await db.fetchrow(query, user_id, card_number, cvv)
+            if payment_detail:
+                return payment_detail
+
+            query = """
+                select * from payment_details
+                where user_id = $1 and detail_hash = payment_detail_hash($2, $3) and archived_at is null;
+            """
+            payment_detail = await db.fetchrow(query, user_id, card_number, cvv)
+            if payment_detail:
+                return payment_detail
+
+    async def get_shipping_details(self, user_id: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
         query = """
-            insert into shipping_details(address) values
-            ($1)
-            returning *;
+            select * from shipping_details where user_id = $1 and archived_at is null
+            order by id;
         """
-        shipping_detail = await db.fetchrow(query, address)
-        return shipping_detail
+        shipping_details = await db.fetch(query, user_id)
+        return shipping_details
 
-    async def register_payment_detail(self, card_number: str, cvv: str, db: asyncpg.Connection) -> asyncpg.Record:
+    async def get_payment_details(self, user_id: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
         query = """
-            insert into payment_details(card_number, cvv) values
-            ($1, $2)
-            returning *;
+            select * from payment_details where user_id = $1 and archived_at is null
+            order by id;
+        """
+        payment_details = await db.fetch(query, user_id)
+        return payment_details
+
+    async def get_saved_detail_ids(
+        self, shipping_detail_id: int | None, payment_detail_id: int | None, user_id: int, db: asyncpg.Connection
+    ) -> asyncpg.Record:
+        query = """
+            select
+                (
+                    select id from shipping_details where id = $1 and user_id = $3 and archived_at is null
+                ) as shipping_detail_id,
+                (
+                    select id from payment_details where id = $2 and user_id = $3 and archived_at is null
+                ) as payment_detail_id;
+        """
+        saved_detail_ids = await db.fetchrow(query, shipping_detail_id, payment_detail_id, user_id)
+        return saved_detail_ids
+
+    async def remove_shipping_detail(self, shipping_detail_id: int, user_id: int, db: asyncpg.Connection) -> bool:
+        # Archived rather than deleted, as past orders still point at it.
+        query = """
+            update shipping_details set archived_at = current_timestamp
+            where id = $1 and user_id = $2 and archived_at is null;
         """
-        payment_detail = await db.fetchrow(query, card_number, cvv)
-        return payment_detail
+        result = await db.execute(query, shipping_detail_id, user_id)
+        return result != "UPDATE 0"
+
+    async def remove_payment_detail(self, payment_detail_id: int, user_id: int, db: asyncpg.Connection) -> bool:
+        query = """
+            update payment_details set archived_at = current_timestamp
+            where id = $1 and user_id = $2 and archived_at is null;
+        """
+        result = await db.execute(query, payment_detail_id, user_id)
+        return result != "UPDATE 0"
 
     async def register_order(
-        self, total: float, user_id: int, shipping_detail_id: int, payment_detail_id: int, db: asyncpg.Connection
+        self,
+        total: float,
+        user_id: int,
+        shipping_detail_id: int,
+        payment_detail_id: int,
+        summary: dict,
+        db: asyncpg.Connection,
     ) -> asyncpg.Record:
         query = """
-            insert into orders(total, user_id, shipping_detail_id, payment_detail_id) values
-            ($1, $2, $3, $4)
+            insert into orders(total, user_id, shipping_detail_id, payment_detail_id, summary) values
+            ($1, $2, $3, $4, $5)
             returning *;
         """
-        order = await db.fetchrow(query, total, user_id, shipping_detail_id, payment_detail_id)
+        order = await db.fetchrow(query, total, user_id, shipping_detail_id, payment_detail_id, summary)
         return order
 
     async def register_order_detail(
-        self, item_id: int, qty: int, order_id: int, db: asyncpg.Connection
+        self, item_id: int, qty: int, order_id: int, order_date: datetime, db: asyncpg.Connection
     ) -> asyncpg.Record:
         query = """
-            insert into order_details(item_id, qty, order_id) values
-            ($1, $2, $3)
+            insert into order_details(item_id, qty, order_id, order_date) values
+            ($1, $2, $3, $4)
             returning *;
         """
-        order_detail = await db.fetchrow(query, item_id, qty, order_id)
+        order_detail = await db.fetchrow(query, item_id, qty, order_id, order_date)
         return order_detail
 
-    async def get_order_items(self, order_id: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
+    async def get_order_items(
+        self, order_id: int, order_date: datetime, db: asyncpg.Connection
+    ) -> list[asyncpg.Record]:
         query = """
-            select i.id, i.name, i.price, i.category, od.qty from orders o
-            join order_details od on o.id = od.order_id
+            select i.id, i.name, i.price, i.category, od.qty from order_details od
             join items i on od.item_id = i.id
-            where o.id = $1;
+            where od.order_id = $1 and od.order_date = $2;
         """
-        order_details = await db.fetch(query, order_id)
+        order_details = await db.fetch(query, order_id, order_date)
         return order_details
 
-    async def get_order(self, order_id: int, db: asyncpg.Connection) -> asyncpg.Record | None:
+    async def get_order(
+        self, order_id: int, db: asyncpg.Connection, order_date: datetime | None = None
+    ) -> asyncpg.Record | None:
+        if order_date is None:
+            query = """
+                select * from orders where id = $1;
+            """
+            order = await db.fetchrow(query, order_id)
+            return order
+
+        # With the date known only one partition is searched.
         query = """
-            select * from orders where id = $1;
+            select * from orders where id = $1 and order_date = $2;
         """
-        order = await db.fetchrow(query, order_id)
+        order = await db.fetchrow(query, order_id, order_date)
         return order
 
-    async def get_user_orders(self, user_id: int, db: asyncpg.Connection) -> list[asyncpg.Record]:
+    async def get_user_orders(
+        self, user_id: int, db: asyncpg.Connection, since: datetime | None = None
+    ) -> list[asyncpg.Record]:
+        if since is None:
+            query = """
+                select * from orders where user_id = $1
+                order by order_date desc;
+            """
+            orders = await db.fetch(query, user_id)
+            return orders
+
+        # With a start date older partitions are skipped.
         query = """
-            select * from orders where user_id = $1;
+            select * from orders where user_id = $1 and order_date >= $2
+            order by order_date desc;
         """
-        orders = await db.fetch(query, user_id)
+        orders = await db.fetch(query, user_id, since)
 
         return orders
+
+    async def create_order_partitions(self, start_month: date, months: int, db: asyncpg.Connection) -> None:
+        query = """
+            select create_order_partitions($1, $2);
+        """
+        await db.execute(query, start_month, months)
+
+    async def get_order_partitions(self, db: asyncpg.Connection) -> list[str]:
+        query = """
+            select c.relname from pg_inherits i
+            join pg_class c on i.inhrelid = c.oid
+            where i.inhparent = 'orders'::regclass
+            order by c.relname;
+        """
+        partitions = await db.fetch(query)
+        return [partition["relname"] for partition in partitions]
+
+    async def count_order_partition_rows(self, suffix: str, db: asyncpg.Connection) -> tuple[int, int]:
+        # Locked against writes, so the counts still hold when the partitions are dropped in the same transaction.
+        await db.execute(f"lock table orders_{suffix}, order_details_{suffix} in share mode;")
+        orders = await db.fetchval(f"select count(*) from orders_{suffix};")
+        order_details = await db.fetchval(f"select count(*) from order_details_{suffix};")
+        return orders, order_details
+
+    async def drop_order_partition(self, suffix: str, db: asyncpg.Connection) -> None:
+        # Details go first, as the orders partition cannot be detached while rows still reference it.
+        await db.execute(f"alter table order_details detach partition order_details_{suffix};")
+        await db.execute(f"drop table order_details_{suffix};")
+        await db.execute(f"alter table orders detach partition orders_{suffix};")
+        await db.execute(f"drop table orders_{suffix};")
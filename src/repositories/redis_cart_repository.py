@@ -0,0 +1,67 @@
+import redis
+
+# Carts live in one hash per user, item id to quantity, plus a "_" field marking a hash loaded from Postgres.
+# Users whose hash changed since it was last written to Postgres are kept in a set for the write-behind flusher.
+hydrated_field = "_"
+dirty_carts_key = "carts:dirty"
+
+hydrate_cart_script = """
+    if redis.call('exists', KEYS[1]) == 1 then
+        return 0
+    end
+    redis.call('hset', KEYS[1], ARGV[1], 1, unpack(ARGV, 2))
+    return 1
+"""
+
+update_qty_script = """
+    if ARGV[3] == '1' and redis.call('hexists', KEYS[1], ARGV[1]) == 0 then
+        return false
+    end
+    local qty = redis.call('hincrby', KEYS[1], ARGV[1], ARGV[2])
+    if qty <= 0 then
+        redis.call('hdel', KEYS[1], ARGV[1])
+    end
+    redis.call('sadd', KEYS[2], ARGV[4])
+    return qty
+"""
+
+
+class RedisCartRepository:
+    @staticmethod
+    def get_key(user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    def is_hydrated(self, user_id: int, redis: redis.Redis) -> bool:
+        return bool(redis.exists(self.get_key(user_id)))
+
+    def hydrate_cart(self, user_id: int, qtys: dict[int, int], redis: redis.Redis) -> None:
+        args = [hydrated_field]
+        for item_id, qty in qtys.items():
+            args.extend([item_id, qty])
+
+        redis.register_script(hydrate_cart_script)(keys=[self.get_key(user_id)], args=args)
+
+    def update_qty(self, item_id: int, qty: int, user_id: int, must_exist: bool, redis: redis.Redis) -> int | None:
+        script = redis.register_script(update_qty_script)
+        return script(
+            keys=[self.get_key(user_id), dirty_carts_key], args=[item_id, qty, "1" if must_exist else "0", user_id]
+        )
+
+    def clear_cart(self, user_id: int, redis: redis.Redis) -> None:
+        pipeline = redis.pipeline()
+        pipeline.delete(self.get_key(user_id))
+        pipeline.hset(self.get_key(user_id), hydrated_field, 1)
+        pipeline.sadd(dirty_carts_key, user_id)
+        pipeline.execute()
+
+    def get_cart(self, user_id: int, redis: redis.Redis) -> dict[int, int]:
+        cart = redis.hgetall(self.get_key(user_id))
+        return {int(item_id): int(qty) for item_id, qty in cart.items() if item_id != hydrated_field}  # type: ignore
+
+    def pop_dirty_carts(self, count: int, redis: redis.Redis) -> list[int]:
+        user_ids = redis.spop(dirty_carts_key, count)
+        return [int(user_id) for user_id in user_ids or []]  # type: ignore
+
+    def mark_dirty(self, user_ids: list[int], redis: redis.Redis) -> None:
+        if user_ids:
+            redis.sadd(dirty_carts_key, *user_ids)
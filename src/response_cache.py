@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+from collections import OrderedDict
+
+from fastapi import Response
+from single_flight import SingleFlight
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress(body: bytes) -> dict[str, bytes]:
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+
+    if brotli:
+        bodies["br"] = brotli.compress(body, quality=9)
+    if zstandard:
+        bodies["zstd"] = zstandard.ZstdCompressor(level=10).compress(body)
+
+    return bodies
+
+
+def select_encoding(accept_encoding: str, encodings: list[str]) -> str:
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best_encoding, best_quality = "identity", 0.0
+    for encoding in encodings:
+        default_quality = 0.001 if encoding == "identity" else 0.0
+        quality = qualities.get(encoding, qualities.get("*", default_quality))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+
+    return best_encoding
+
+
+class CachedResponse:
+    def __init__(self, bodies: dict[str, bytes]):
+        self.bodies = bodies
+        self.size = sum(len(body) for body in bodies.values())
+        # Smallest variants first so ties in Accept-Encoding go to the better compression.
+        self.encodings = sorted(bodies, key=lambda encoding: len(bodies[encoding]))
+
+    def to_response(self, accept_encoding: str, headers: dict[str, str]) -> Response:
+        encoding = select_encoding(accept_encoding, self.encodings)
+        headers = {**headers, "Vary": "Accept-Encoding"}
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+            if "ETag" in headers:
+                headers["ETag"] = f'{headers["ETag"][:-1]}-{encoding}"'
+
+        return Response(content=self.bodies[encoding], media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fills = SingleFlight()
+
+    def get(self, key: tuple[str, str]) -> CachedResponse | None:
+        cached_response = self.entries.get(key)
+
+        if not cached_response:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return cached_response
+
+    def remove(self, key: tuple[str, str]) -> None:
+        cached_response = self.entries.pop(key, None)
+        if cached_response:
+            self.size -= cached_response.size
+
+    async def put(self, key: tuple[str, str], body: bytes) -> CachedResponse:
+        # Misses on the same key have the same body, so they share one compression instead of each running their own.
+        return await self.fills.do(key, lambda: self.fill(key, body))
+
+    async def fill(self, key: tuple[str, str], body: bytes) -> CachedResponse:
+        # A miss whose body was loaded while an earlier fill of the key finished takes that entry as it is.
+        if key in self.entries:
+            return self.entries[key]
+
+        cached_response = CachedResponse(await asyncio.to_thread(compress, body))
+
+        if cached_response.size > self.max_bytes:
+            return cached_response
+
+        # Entries for older catalog versions of the same query can never be hit again.
+        query = key[0]
+        for stale_key in [k for k in self.entries if k[0] == query and k != key]:
+            self.remove(stale_key)
+
+        self.remove(key)
+        self.entries[key] = cached_response
+        self.size += cached_response.size
+
+        while self.size > self.max_bytes:
+            _, evicted_response = self.entries.popitem(last=False)
+            self.size -= evicted_response.size
+            self.evictions += 1
+
+        return cached_response
+
+    def get_metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "fills": self.fills.get_metrics(),
+        }
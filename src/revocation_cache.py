@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import redis
+from circuit_breaker import redis_unavailable_errors
+
+# Every revocation is also added to one sorted set, scored by when it lapses, so each worker can keep a copy
+# of all of them and still turn away revoked tokens while Redis is unreachable.
+revocations_key = "access_token_revocations"
+
+
+class RevocationCache:
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.revoked_tids: set[str] = set()
+        self.min_issue_dates: dict[int, int] = {}
+        self.refreshed_at = None
+        self.metrics = {"accepted": 0, "rejected": 0}
+        self.redis = None
+        self.refresh_task = None
+
+    def add(self, member: str) -> None:
+        if member.startswith("tid:"):
+            self.revoked_tids.add(member[4:])
+        else:
+            _, user_id, issue_date = member.split(":")
+            self.min_issue_dates[int(user_id)] = max(int(issue_date), self.min_issue_dates.get(int(user_id), 0))
+
+    def revoke(self, member: str, ttl: int, pipeline: redis.client.Pipeline) -> None:
+        pipeline.zadd(revocations_key, {member: time.time() + ttl})
+        self.add(member)
+
+    def refresh(self) -> None:
+        pipeline = self.redis.pipeline()  # type: ignore
+        pipeline.zremrangebyscore(revocations_key, "-inf", time.time())
+        pipeline.zrange(revocations_key, 0, -1)
+        _, members = pipeline.execute()
+
+        self.revoked_tids, self.min_issue_dates = set(), {}
+        for member in members:
+            self.add(member)
+        self.refreshed_at = time.time()
+
+    def is_revoked(self, user_id: int, tid: str, issue_date: int) -> bool:
+        revoked = tid in self.revoked_tids or issue_date < self.min_issue_dates.get(user_id, 0)
+        self.metrics["rejected" if revoked else "accepted"] += 1
+        return revoked
+
+    async def refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except redis_unavailable_errors as exc:
+                print(f"Refreshing revoked access tokens failed: {exc}")
+
+    def setup(self, redis: redis.Redis) -> None:
+        self.redis = redis
+        self.refresh_task = asyncio.create_task(self.refresh_periodically())
+
+    def teardown(self) -> None:
+        if self.refresh_task:
+            self.refresh_task.cancel()
+
+    def get_metrics(self) -> dict:
+        return {
+            "fallbacks": self.metrics,
+            "revoked_tokens": len(self.revoked_tids),
+            "revoked_users": len(self.min_issue_dates),
+            "refreshed_at": self.refreshed_at,
+        }
@@ -0,0 +1,142 @@
+from datetime import date
+
+from change_feed import ItemChangeFeed
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from jobs import JobRunner
+from rating_buffer import RatingBuffer
+from response_cache import ResponseCache
+from revocation_cache import RevocationCache
+from services.flash_sale_service import FlashSaleService
+from services.item_service import ItemService
+from services.job_service import JobService
+from single_flight import SingleFlight
+from slow_query_log import SlowQueryLog
+from states import (
+    LazyConnection,
+    RedisClient,
+    get_item_change_feed,
+    get_item_single_flight,
+    get_job_runner,
+    get_postgres_conn,
+    get_rating_buffer,
+    get_redis_client,
+    get_response_cache,
+    get_revocation_cache,
+    get_slow_query_log,
+    get_tracer,
+    verify_admin_token,
+)
+from tracing import Tracer
+
+router = APIRouter(prefix="/v1/admin", tags=["Admin"], dependencies=[Depends(verify_admin_token)])
+
+
+@router.get(path="/metrics", status_code=status.HTTP_200_OK, response_model=dict, summary="Get server metrics")
+async def get_metrics(
+    response_cache: ResponseCache = Depends(get_response_cache),
+    job_runner: JobRunner = Depends(get_job_runner),
+    item_single_flight: SingleFlight = Depends(get_item_single_flight),
+    redis_client: RedisClient = Depends(get_redis_client),
+    revocation_cache: RevocationCache = Depends(get_revocation_cache),
+    rating_buffer: RatingBuffer = Depends(get_rating_buffer),
+    item_change_feed: ItemChangeFeed = Depends(get_item_change_feed),
+    job_service: JobService = Depends(),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    return {
+        "response_cache": response_cache.get_metrics(),
+        "item_single_flight": item_single_flight.get_metrics(),
+        "redis": {"breaker": redis_client.breaker.get_metrics(), "revocation_cache": revocation_cache.get_metrics()},
+        "rating_buffer": rating_buffer.get_metrics(),
+        "item_change_feed": item_change_feed.get_metrics(),
+        "jobs": {"runs": job_runner.get_metrics(), "queue": await job_service.get_job_counts(db=db)},
+    }
+
+
+@router.get(path="/traces", status_code=status.HTTP_200_OK, response_model=list[dict], summary="List recent traces")
+async def get_traces(tracer: Tracer = Depends(get_tracer)):
+    return tracer.get_summaries()
+
+
+@router.get(path="/traces/{trace_id}", status_code=status.HTTP_200_OK, response_model=dict, summary="Get a trace")
+async def get_trace(trace_id: str, tracer: Tracer = Depends(get_tracer)):
+    trace = tracer.get_trace(trace_id)
+
+    if not trace:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="trace not found.")
+
+    return trace.get_tree()
+
+
+@router.get(
+    path="/slow-queries",
+    status_code=status.HTTP_200_OK,
+    response_model=list[dict],
+    summary="Get the slowest statements by total time",
+)
+async def get_slow_queries(
+    limit: int = Query(default=20, ge=1, le=100), slow_query_log: SlowQueryLog = Depends(get_slow_query_log)
+):
+    return slow_query_log.get_top_statements(limit)
+
+
+@router.get(
+    path="/flash-sales", status_code=status.HTTP_200_OK, response_model=list[dict], summary="List running flash sales"
+)
+async def get_flash_sales(flash_sale_service: FlashSaleService = Depends()):
+    return flash_sale_service.get_flash_sales()
+
+
+@router.post(
+    path="/flash-sales/{item_id}",
+    status_code=status.HTTP_201_CREATED,
+    response_model=dict,
+    summary="Move an item's stock into Redis for a flash sale",
+)
+async def start_flash_sale(
+    item_id: int,
+    flash_sale_service: FlashSaleService = Depends(),
+    item_service: ItemService = Depends(),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    # One snapshot for the item and its pending commit jobs, so a job finishing in between is not counted twice.
+    async with db.transaction(isolation="repeatable_read"):
+        item_model = await item_service.get_item(item_id=item_id, db=db)
+
+        if not item_model:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item not found.")
+
+        stock = await flash_sale_service.start_flash_sale(item_id=item_id, db=db)
+
+    if stock is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="flash sale already running.")
+
+    return {"item_id": item_id, "stock": stock}
+
+
+@router.delete(
+    path="/flash-sales/{item_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=None,
+    summary="Return an item to regular checkout",
+)
+async def end_flash_sale(item_id: int, flash_sale_service: FlashSaleService = Depends()):
+    if not flash_sale_service.end_flash_sale(item_id=item_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="flash sale not found.")
+
+
+@router.post(
+    path="/exports/orders",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=None,
+    summary="Export orders between two days to compressed files in the background",
+)
+async def export_orders(
+    start: date, end: date, job_service: JobService = Depends(), db: LazyConnection = Depends(get_postgres_conn)
+):
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end.")
+
+    await job_service.enqueue(
+        kind="export_orders", payload={"start": start.isoformat(), "end": end.isoformat()}, db=db, max_attempts=3
+    )
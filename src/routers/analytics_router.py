@@ -0,0 +1,57 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, status
+from models import CategoryRevenueModel, LowStockItemModel, TopSellerModel
+from services.analytics_service import AnalyticsService
+from states import LazyConnection, get_postgres_read_conn, verify_admin_token
+from tracing import TracedRoute
+
+router = APIRouter(
+    prefix="/v1/analytics", tags=["Analytics"], dependencies=[Depends(verify_admin_token)], route_class=TracedRoute
+)
+
+
+@router.get(
+    path="/top-sellers", status_code=status.HTTP_200_OK, response_model=list[TopSellerModel], summary="Get top sellers"
+)
+async def get_top_sellers(
+    days: int = Query(default=30, ge=1, le=366),
+    order_by: Literal["revenue", "units"] = Query(default="revenue"),
+    limit: int = Query(default=10, ge=1, le=100),
+    analytics_service: AnalyticsService = Depends(),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    top_seller_models = await analytics_service.get_top_sellers(days=days, order_by=order_by, limit=limit, db=db)
+    return top_seller_models
+
+
+@router.get(
+    path="/categories/revenue",
+    status_code=status.HTTP_200_OK,
+    response_model=list[CategoryRevenueModel],
+    summary="Get daily revenue per category",
+)
+async def get_category_revenue(
+    days: int = Query(default=30, ge=1, le=366),
+    category: str | None = Query(default=None, max_length=25),
+    analytics_service: AnalyticsService = Depends(),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    category_revenue_models = await analytics_service.get_category_revenue(days=days, category=category, db=db)
+    return category_revenue_models
+
+
+@router.get(
+    path="/low-stock",
+    status_code=status.HTTP_200_OK,
+    response_model=list[LowStockItemModel],
+    summary="Get items running out of stock",
+)
+async def get_low_stock_items(
+    threshold: int = Query(default=10, ge=0),
+    days: int = Query(default=7, ge=1, le=90),
+    analytics_service: AnalyticsService = Depends(),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    low_stock_item_models = await analytics_service.get_low_stock_items(threshold=threshold, days=days, db=db)
+    return low_stock_item_models
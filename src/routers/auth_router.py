@@ -1,13 +1,13 @@
-import asyncpg
 from config.settings import Settings
 from fastapi import APIRouter, Depends, HTTPException, status
 from models import AccessTokenModel, UserCredentialModel
 from redis import Redis
 from services.auth_service import AuthService
 from services.user_service import UserService
-from states import get_access_token, get_postgres_conn, get_redis, get_settings
+from states import LazyConnection, get_access_token, get_postgres_conn, get_redis, get_settings
+from tracing import TracedRoute
 
-router = APIRouter(prefix="/v1/auth", tags=["Auth"])
+router = APIRouter(prefix="/v1/auth", tags=["Auth"], route_class=TracedRoute)
 
 
 @router.post(
@@ -21,7 +21,7 @@ async def sign_in(
     user_service: UserService = Depends(),
     auth_service: AuthService = Depends(),
     settings: Settings = Depends(get_settings),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
 ):
     user_model = await user_service.verify_user(
         username=user_credential_model.username, password=user_credential_model.password, db=db
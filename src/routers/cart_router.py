@@ -1,4 +1,3 @@
-import asyncpg
 from config.settings import Settings
 from fastapi import APIRouter, Depends, HTTPException, status
 from models import CartSummaryModel
@@ -6,9 +5,10 @@ from redis import Redis
 from services.auth_service import AuthService
 from services.cart_service import CartService
 from services.item_service import ItemService
-from states import get_access_token, get_postgres_conn, get_redis, get_settings
+from states import LazyConnection, get_access_token, get_postgres_conn, get_redis, get_settings
+from tracing import TracedRoute
 
-router = APIRouter(prefix="/v1/carts", tags=["Cart"])
+router = APIRouter(prefix="/v1/carts", tags=["Cart"], route_class=TracedRoute)
 
 
 @router.patch(
@@ -19,7 +19,7 @@ async def update_item_qty(
     qty: int,
     access_token: str = Depends(get_access_token),
     cart_service: CartService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
     item_service: ItemService = Depends(),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
@@ -39,7 +39,7 @@ async def update_item_qty(
     if not item_model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found.")
 
-    async with db.transaction():
+    async with cart_service.transaction(db):
         if qty == 0:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Quantity can't be 0.")
 
@@ -58,7 +58,7 @@ async def update_item_qty(
 )
 async def clear_cart(
     cart_service: CartService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
     auth_service: AuthService = Depends(),
@@ -73,14 +73,14 @@ async def clear_cart(
 
     user_id = claims["sub"]
 
-    async with db.transaction():
+    async with cart_service.transaction(db):
         await cart_service.clear_cart(user_id=user_id, db=db)
 
 
 @router.get(path="/me", status_code=status.HTTP_200_OK, response_model=CartSummaryModel, summary="Show my cart")
 async def get_cart_summary(
     cart_service: CartService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
     auth_service: AuthService = Depends(),
@@ -94,5 +94,8 @@ async def get_cart_summary(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
 
     user_id = claims["sub"]
-    cart_summary_model = await cart_service.get_cart_summary(user_id=user_id, db=db)
+
+    async with db.checkout():
+        cart_summary_model = await cart_service.get_cart_summary(user_id=user_id, db=db)
+
     return cart_summary_model
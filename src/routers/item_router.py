@@ -1,40 +1,127 @@
-import asyncpg
-from fastapi import APIRouter, Depends, HTTPException, status
+from change_feed import ItemChangeFeed
+from config.settings import Settings
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from http_cache import get_cache_headers, get_not_modified_response, is_not_modified
 from models import ItemModel, ItemRatingModel, ItemRegistrationModel
+from pydantic import TypeAdapter
+from rating_buffer import RatingBuffer
+from redis import Redis
+from response_cache import ResponseCache
+from services.idempotency_service import IdempotencyService
 from services.item_service import ItemService
-from states import get_postgres_conn
+from states import (
+    LazyConnection,
+    get_item_change_feed,
+    get_postgres_conn,
+    get_postgres_read_conn,
+    get_rating_buffer,
+    get_redis,
+    get_response_cache,
+    get_settings,
+)
+from tracing import TracedRoute
+
+router = APIRouter(prefix="/v1/items", tags=["Item"], route_class=TracedRoute)
 
-router = APIRouter(prefix="/v1/items", tags=["Item"])
+item_models_adapter = TypeAdapter(list[ItemModel])
 
 
 @router.post(path="", status_code=status.HTTP_201_CREATED, response_model=ItemModel, summary="Register item")
 async def register_item(
     item_registration_model: ItemRegistrationModel,
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
+    redis: Redis = Depends(get_redis),
+    idempotency_service: IdempotencyService = Depends(),
+    idempotency_key: str | None = Header(default=None, max_length=255),
 ):
-    async with db.transaction():
-        item_model = await item_service.register_item(
-            name=item_registration_model.name,
-            price=item_registration_model.price,
-            category=item_registration_model.category,
-            qty=item_registration_model.qty,
-            db=db,
-        )
-    return item_model
+    async def create_item():
+        async with db.transaction():
+            item_model = await item_service.register_item(
+                name=item_registration_model.name,
+                price=item_registration_model.price,
+                category=item_registration_model.category,
+                qty=item_registration_model.qty,
+                db=db,
+            )
+        return item_model
+
+    return await idempotency_service.execute(
+        scope="items",
+        idempotency_key=idempotency_key,
+        fingerprint=idempotency_service.get_fingerprint(item_registration_model),
+        status_code=status.HTTP_201_CREATED,
+        redis=redis,
+        call=create_item,
+    )
+
+
+@router.get(
+    path="/search", status_code=status.HTTP_200_OK, response_model=list[ItemModel], summary="Search items by keyword"
+)
+async def search_items(
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    item_service: ItemService = Depends(),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    item_models = await item_service.search_items(keyword=q, limit=limit, offset=offset, db=db)
+    return item_models
+
+
+@router.get(
+    path="/autocomplete", status_code=status.HTTP_200_OK, response_model=list[str], summary="Autocomplete item names"
+)
+async def autocomplete(
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    item_service: ItemService = Depends(),
+):
+    names = item_service.autocomplete(prefix=prefix, limit=limit)
+    return names
+
+
+@router.get(path="/changes", status_code=status.HTTP_200_OK, summary="Stream item changes as server-sent events")
+async def stream_item_changes(
+    ids: list[int] | None = Query(default=None, max_length=100),
+    item_change_feed: ItemChangeFeed = Depends(get_item_change_feed),
+):
+    if not item_change_feed.has_capacity():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many subscribers.")
+
+    return StreamingResponse(
+        item_change_feed.stream(set(ids) if ids else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get(path="/{item_id}", status_code=status.HTTP_200_OK, response_model=ItemModel, summary="Search item")
 async def get_item(
     item_id: int,
+    request: Request,
+    response: Response,
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    settings: Settings = Depends(get_settings),
+    db: LazyConnection = Depends(get_postgres_read_conn),
 ):
-    item_model = await item_service.get_item(item_id=item_id, db=db)
+    async with db.checkout():
+        catalog_version_model = await item_service.get_item_version(item_id=item_id, db=db)
+
+        if not catalog_version_model:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item not found.")
+
+        if is_not_modified(request, catalog_version_model):
+            return get_not_modified_response(catalog_version_model, settings.CATALOG_CACHE_CONTROL)
+
+        item_model = await item_service.get_item(item_id=item_id, db=db)
 
     if not item_model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item not found.")
 
+    response.headers.update(get_cache_headers(catalog_version_model, settings.CATALOG_CACHE_CONTROL))
     return item_model
 
 
@@ -42,28 +129,51 @@ async def get_item(
 async def remove_item(
     item_id: int,
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
 ):
     item_model = await item_service.get_item(item_id=item_id, db=db)
 
     if not item_model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item not found.")
 
-    await item_service.remove_item(item_id=item_id, db=db)
+    await item_service.remove_item(item_id=item_id, name=item_model.name, db=db)
 
 
 @router.get(path="", status_code=status.HTTP_200_OK, response_model=list[ItemModel], summary="Get all items")
 async def get_all_items(
+    request: Request,
+    ids: list[int] | None = Query(default=None, max_length=100),
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    settings: Settings = Depends(get_settings),
+    response_cache: ResponseCache = Depends(get_response_cache),
+    db: LazyConnection = Depends(get_postgres_read_conn),
 ):
-    item_models = await item_service.get_all_items(db=db)
-    return item_models
+    if ids is not None:
+        item_models = await item_service.get_items(item_ids=ids, db=db)
+        return item_models
+
+    async with db.checkout():
+        catalog_version_model = await item_service.get_catalog_version(db=db)
+
+        if is_not_modified(request, catalog_version_model):
+            return get_not_modified_response(catalog_version_model, settings.CATALOG_CACHE_CONTROL)
+
+        cache_key = (f"{request.url.path}?{request.url.query}", catalog_version_model.etag)
+        cached_response = response_cache.get(cache_key)
+
+        if not cached_response:
+            item_models = await item_service.get_all_items(db=db)
+
+    if not cached_response:
+        cached_response = await response_cache.put(cache_key, item_models_adapter.dump_json(item_models))
+
+    headers = get_cache_headers(catalog_version_model, settings.CATALOG_CACHE_CONTROL)
+    return cached_response.to_response(request.headers.get("accept-encoding", ""), headers)
 
 
 @router.patch(path="/{item_id}", status_code=status.HTTP_200_OK, response_model=None, summary="Update item quantity")
 async def update_item_qty(
-    item_id: int, qty: int, item_service: ItemService = Depends(), db: asyncpg.Connection = Depends(get_postgres_conn)
+    item_id: int, qty: int, item_service: ItemService = Depends(), db: LazyConnection = Depends(get_postgres_conn)
 ):
     item_model = await item_service.get_item(item_id=item_id, db=db)
 
@@ -76,7 +186,8 @@ async def update_item_qty(
         elif qty > 0:
             await item_service.increase_qty(item_id=item_id, qty=qty, db=db)
         else:
-            await item_service.decrease_qty(item_id=item_id, qty=abs(qty), db=db)
+            if not await item_service.decrease_qty(item_id=item_id, qty=abs(qty), db=db):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Quantity can't go below 0.")
 
 
 @router.get(
@@ -87,28 +198,57 @@ async def update_item_qty(
 )
 async def get_items_by_category(
     category: str,
+    request: Request,
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    settings: Settings = Depends(get_settings),
+    response_cache: ResponseCache = Depends(get_response_cache),
+    db: LazyConnection = Depends(get_postgres_read_conn),
 ):
-    items = await item_service.get_items_by_category(category=category, db=db)
-    return items
+    async with db.checkout():
+        catalog_version_model = await item_service.get_catalog_version(db=db, category=category)
+
+        if is_not_modified(request, catalog_version_model):
+            return get_not_modified_response(catalog_version_model, settings.CATALOG_CACHE_CONTROL)
+
+        cache_key = (f"{request.url.path}?{request.url.query}", catalog_version_model.etag)
+        cached_response = response_cache.get(cache_key)
+
+        if not cached_response:
+            items = await item_service.get_items_by_category(category=category, db=db)
+
+    if not cached_response:
+        cached_response = await response_cache.put(cache_key, item_models_adapter.dump_json(items))
 
+    headers = get_cache_headers(catalog_version_model, settings.CATALOG_CACHE_CONTROL)
+    return cached_response.to_response(request.headers.get("accept-encoding", ""), headers)
 
-@router.post(path="/ratings", status_code=status.HTTP_200_OK, response_model=None, summary="Rate an item")
+
+@router.post(path="/ratings", status_code=status.HTTP_202_ACCEPTED, response_model=None, summary="Rate an item")
 async def rate_item(
     item_rating_model: ItemRatingModel,
-    item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    rating_buffer: RatingBuffer = Depends(get_rating_buffer),
+    redis: Redis = Depends(get_redis),
+    idempotency_service: IdempotencyService = Depends(),
+    idempotency_key: str | None = Header(default=None, max_length=255),
 ):
     if item_rating_model.rating < 1 or item_rating_model.rating > 5:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Rating must be in between 1 and 5")
 
-    item_model = await item_service.get_item(item_id=item_rating_model.item_id, db=db)
-
-    if not item_model:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item not found.")
+    async def create_item_rating():
+        # Written in batches; ratings for items that no longer exist are dropped at flush time.
+        if not rating_buffer.add(item_id=item_rating_model.item_id, rating=item_rating_model.rating):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many ratings pending, try again later."
+            )
 
-    await item_service.register_item_rating(item_id=item_rating_model.item_id, rating=item_rating_model.rating, db=db)
+    return await idempotency_service.execute(
+        scope="ratings",
+        idempotency_key=idempotency_key,
+        fingerprint=idempotency_service.get_fingerprint(item_rating_model),
+        status_code=status.HTTP_202_ACCEPTED,
+        redis=redis,
+        call=create_item_rating,
+    )
 
 
 @router.get(
@@ -118,7 +258,7 @@ async def rate_item(
     summary="Get all ratings of this item",
 )
 async def get_item_ratings(
-    item_id: int, item_service: ItemService = Depends(), db: asyncpg.Connection = Depends(get_postgres_conn)
+    item_id: int, item_service: ItemService = Depends(), db: LazyConnection = Depends(get_postgres_read_conn)
 ):
     item_rating_models = await item_service.get_item_ratings(item_id=item_id, db=db)
     return item_rating_models
@@ -1,21 +1,29 @@
+import asyncio
+from datetime import datetime
+
 import asyncpg
 from config.settings import Settings
-from fastapi import APIRouter, Depends, HTTPException, status
-from models import OrderRegistrationModel, OrderSummaryModel
-from redis import Redis
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from models import ItemModel, OrderModel, OrderRegistrationModel, OrderSummaryModel
+from redis import Redis, RedisError
 from services.auth_service import AuthService
 from services.cart_service import CartService
+from services.flash_sale_service import FlashSaleService
+from services.idempotency_service import IdempotencyService
 from services.item_service import ItemService
+from services.job_service import JobService
 from services.order_service import OrderService
-from states import get_access_token, get_postgres_conn, get_redis, get_settings
+from states import LazyConnection, get_access_token, get_postgres_conn, get_postgres_read_conn, get_redis, get_settings
+from tracing import TracedRoute
 
-router = APIRouter(prefix="/v1/orders", tags=["Order"])
+router = APIRouter(prefix="/v1/orders", tags=["Order"], route_class=TracedRoute)
 
 
 @router.get("/me", response_model=list[OrderSummaryModel], summary="Get my order history")
 async def get_user_orders(
+    since: datetime | None = Query(default=None),
     order_service: OrderService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_read_conn),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
     auth_service: AuthService = Depends(),
@@ -29,7 +37,10 @@ async def get_user_orders(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
 
     user_id = claims["sub"]
-    user_orders_summary_model = await order_service.get_user_orders_summary(user_id=user_id, db=db)
+
+    async with db.checkout():
+        user_orders_summary_model = await order_service.get_user_orders_summary(user_id=user_id, since=since, db=db)
+
     return user_orders_summary_model
 
 
@@ -39,11 +50,15 @@ async def order(
     order_service: OrderService = Depends(),
     cart_service: CartService = Depends(),
     item_service: ItemService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    job_service: JobService = Depends(),
+    flash_sale_service: FlashSaleService = Depends(),
+    db: LazyConnection = Depends(get_postgres_conn),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
     auth_service: AuthService = Depends(),
     access_token: str = Depends(get_access_token),
+    idempotency_service: IdempotencyService = Depends(),
+    idempotency_key: str | None = Header(default=None, max_length=255),
 ):
     claims = auth_service.validate_access_token(
         access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
@@ -54,45 +69,179 @@ async def order(
 
     user_id = claims["sub"]
 
-    item_models = await cart_service.get_items(user_id=user_id, db=db)
-
-    if len(item_models) == 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Your cart is empty.")
-
-    async with db.transaction():
-        shipping_detail_model = await order_service.register_shipping_detail(
-            address=order_registration_model.shipping_detail_registration_model.address, db=db
+    if (order_registration_model.shipping_detail_id is None) == (
+        order_registration_model.shipping_detail_registration_model is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Give either a saved shipping detail or a new one."
         )
 
-        payment_detail_model = await order_service.register_payment_detail(
-            card_number=order_registration_model.payment_detail_registration_model.card_number,
-            cvv=order_registration_model.payment_detail_registration_model.cvv,
-            db=db,
+    if (order_registration_model.payment_detail_id is None) == (
+        order_registration_model.payment_detail_registration_model is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Give either a saved payment detail or a new one."
         )
 
-        total = await cart_service.get_total(user_id=user_id, db=db)
+    async def get_detail_ids() -> tuple[int, int]:
+        shipping_detail_id = order_registration_model.shipping_detail_id
+        payment_detail_id = order_registration_model.payment_detail_id
 
-        order_model = await order_service.register_order(
-            total=total,
-            user_id=user_id,
-            shipping_detail_id=shipping_detail_model.id,
-            payment_detail_id=payment_detail_model.id,
-            db=db,
-        )
+        if shipping_detail_id is not None or payment_detail_id is not None:
+            # Saved details are referenced as they are, after one read to check they belong to this user.
+            saved_shipping_detail_id, saved_payment_detail_id = await order_service.get_saved_detail_ids(
+                shipping_detail_id=shipping_detail_id, payment_detail_id=payment_detail_id, user_id=user_id, db=db
+            )
+
+            if shipping_detail_id is not None and saved_shipping_detail_id is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="shipping detail not found.")
 
-        for item_model in item_models:
-            qty = await item_service.get_qty(item_id=item_model.id, db=db)
-            if item_model.qty > qty:
+            if payment_detail_id is not None and saved_payment_detail_id is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="payment detail not found.")
+
+        # New details are saved to the user's profile, where resubmitting the same ones reuses the existing row.
+        if shipping_detail_id is None:
+            shipping_detail_model = await order_service.register_shipping_detail(
+                user_id=user_id, address=order_registration_model.shipping_detail_registration_model.address, db=db
+            )
+            shipping_detail_id = shipping_detail_model.id
+
+        if payment_detail_id is None:
+            payment_detail_model = await order_service.register_payment_detail(
+                user_id=user_id,
+                card_number=order_registration_model.payment_detail_registration_model.card_number,
+                cvv=order_registration_model.payment_detail_registration_model.cvv,
+                db=db,
+            )
+            payment_detail_id = payment_detail_model.id
+
+        return shipping_detail_id, payment_detail_id
+
+    async def register_order(
+        item_models: list[ItemModel], flash_sale_qtys: dict[int, int], reservation_id: str | None
+    ) -> OrderModel:
+        async with db.transaction():
+            if reservation_id and not await flash_sale_service.hold_reservation(reservation_id=reservation_id, db=db):
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"{item_model.name} is low in stock, only {qty} left.",
+                    status_code=status.HTTP_409_CONFLICT, detail="Your flash sale reservation expired, try again."
                 )
 
-            await item_service.decrease_qty(item_id=item_model.id, qty=item_model.qty, db=db)
-            await order_service.register_order_detail(
-                item_id=item_model.id, qty=item_model.qty, order_id=order_model.id, db=db
+            shipping_detail_id, payment_detail_id = await get_detail_ids()
+
+            total = await cart_service.get_total(user_id=user_id, db=db)
+
+            order_model = await order_service.register_order(
+                total=total,
+                user_id=user_id,
+                shipping_detail_id=shipping_detail_id,
+                payment_detail_id=payment_detail_id,
+                item_models=item_models,
+                db=db,
+            )
+
+            regular_item_models = [item_model for item_model in item_models if item_model.id not in flash_sale_qtys]
+            qtys = await asyncio.gather(
+                *(item_service.get_qty(item_id=item_model.id, db=db) for item_model in regular_item_models)
             )
 
-        await cart_service.clear_cart(user_id=user_id, db=db)
-        order_summary_model = await order_service.get_order_summary(order_id=order_model.id, db=db)
-        return order_summary_model
+            for item_model, qty in zip(regular_item_models, qtys):
+                if item_model.qty > qty:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"{item_model.name} is low in stock, only {qty} left.",
+                    )
+
+                if not await item_service.decrease_qty(item_id=item_model.id, qty=item_model.qty, db=db):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST, detail=f"{item_model.name} is low in stock."
+                    )
+
+            for item_model in item_models:
+                await order_service.register_order_detail(
+                    item_id=item_model.id,
+                    qty=item_model.qty,
+                    order_id=order_model.id,
+                    order_date=order_model.order_date,
+                    db=db,
+                )
+
+            order_payload = {"order_id": order_model.id, "order_date": order_model.order_date.isoformat()}
+            await job_service.enqueue(kind="order_placed", payload=order_payload, db=db)
+            await job_service.enqueue(kind="update_sales_rollups", payload=order_payload, db=db)
+
+            if reservation_id:
+                # The reserved stock comes off the items row in the background, one job per order.
+                await job_service.enqueue(
+                    kind="commit_flash_sale",
+                    payload={"reservation_id": reservation_id, "items": flash_sale_qtys},
+                    db=db,
+                )
+
+            if not cart_service.uses_redis:
+                # Cleared with the order, so a committed order never leaves its cart behind to be placed again.
+                await cart_service.clear_cart(user_id=user_id, db=db)
+
+        return order_model
+
+    async def place_order():
+        item_models = await cart_service.get_items(user_id=user_id, db=db)
+
+        if len(item_models) == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Your cart is empty.")
+
+        # Flash sale stock is reserved in Redis up front, so sold-out checkouts never reach the hot items row.
+        flash_sale_qtys = flash_sale_service.get_flash_sale_qtys(item_models=item_models)
+        reservation_id = None
+
+        if flash_sale_qtys:
+            reservation_id, shortage = flash_sale_service.reserve(qtys=flash_sale_qtys)
+
+            if shortage:
+                item_id, stock = shortage
+                name = next(item_model.name for item_model in item_models if item_model.id == item_id)
+                if stock < 0:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT, detail=f"The flash sale of {name} just ended, try again."
+                    )
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} is low in stock, only {stock} left."
+                )
+
+        try:
+            order_model = await register_order(item_models, flash_sale_qtys, reservation_id)
+        except BaseException:
+            if reservation_id:
+                # Settled rather than released outright: a failed commit may still have committed the order.
+                # Anything not settled here expires and is settled by the reconciler.
+                try:
+                    async with db.transaction():
+                        await flash_sale_service.settle_reservation(reservation_id=reservation_id, db=db)
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, RedisError) as exc:
+                    print(f"Settling flash sale reservation {reservation_id} failed: {exc}")
+            raise
+
+        if reservation_id:
+            # The commit job confirms it too, so a failure here does not fail an order that has committed.
+            try:
+                flash_sale_service.confirm(reservation_id)
+            except RedisError as exc:
+                print(f"Confirming flash sale reservation {reservation_id} failed: {exc}")
+
+        if cart_service.uses_redis:
+            # A Redis cart cannot be rolled back with the order, so it is cleared once the order has committed,
+            # and failing to clear it does not fail the order.
+            try:
+                await cart_service.clear_cart(user_id=user_id, db=db)
+            except RedisError as exc:
+                print(f"Clearing the cart of user {user_id} after order {order_model.id} failed: {exc}")
+
+        return OrderSummaryModel(item_models=item_models, order_model=order_model)
+
+    return await idempotency_service.execute(
+        scope=f"orders:{user_id}",
+        idempotency_key=idempotency_key,
+        fingerprint=idempotency_service.get_fingerprint(order_registration_model),
+        status_code=status.HTTP_200_OK,
+        redis=redis,
+        call=place_order,
+    )
@@ -1,7 +1,10 @@
-import asyncpg
 from config.settings import Settings
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from models import (
+    PaymentDetailRegistrationModel,
+    PaymentProfileModel,
+    ShippingDetailModel,
+    ShippingDetailRegistrationModel,
     UserCredentialModel,
     UserModel,
     UserPasswordModel,
@@ -9,23 +12,39 @@ from models import (
 )
 from redis import Redis
 from services.auth_service import AuthService
+from services.idempotency_service import IdempotencyService
+from services.order_service import OrderService
 from services.user_service import UserService
-from states import get_access_token, get_postgres_conn, get_redis, get_settings
+from states import LazyConnection, get_access_token, get_postgres_conn, get_postgres_read_conn, get_redis, get_settings
+from tracing import TracedRoute
 
-router = APIRouter(prefix="/v1/users", tags=["User"])
+router = APIRouter(prefix="/v1/users", tags=["User"], route_class=TracedRoute)
 
 
 @router.post(path="", status_code=status.HTTP_201_CREATED, response_model=UserModel, summary="Register user")
 async def register_user(
     user_credential_model: UserCredentialModel,
     user_service: UserService = Depends(),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
+    redis: Redis = Depends(get_redis),
+    idempotency_service: IdempotencyService = Depends(),
+    idempotency_key: str | None = Header(default=None, max_length=255),
 ):
-    async with db.transaction():
-        user_model = await user_service.register_user(
-            username=user_credential_model.username, password=user_credential_model.password, db=db
-        )
-    return user_model
+    async def create_user():
+        async with db.transaction():
+            user_model = await user_service.register_user(
+                username=user_credential_model.username, password=user_credential_model.password, db=db
+            )
+        return user_model
+
+    return await idempotency_service.execute(
+        scope="users",
+        idempotency_key=idempotency_key,
+        fingerprint=idempotency_service.get_fingerprint(user_credential_model),
+        status_code=status.HTTP_201_CREATED,
+        redis=redis,
+        call=create_user,
+    )
 
 
 @router.get(path="/me", status_code=200, response_model=UserModel, summary="Get my info")
@@ -35,7 +54,7 @@ async def get_user(
     auth_service: AuthService = Depends(),
     settings: Settings = Depends(get_settings),
     redis: Redis = Depends(get_redis),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_read_conn),
 ):
     claims = auth_service.validate_access_token(
         access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
@@ -61,7 +80,7 @@ async def reset_password(
     user_service: UserService = Depends(),
     auth_service: AuthService = Depends(),
     settings: Settings = Depends(get_settings),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
     redis: Redis = Depends(get_redis),
 ):
     claims = auth_service.validate_access_token(
@@ -90,7 +109,7 @@ async def delete_user(
     user_service: UserService = Depends(),
     auth_service: AuthService = Depends(),
     settings: Settings = Depends(get_settings),
-    db: asyncpg.Connection = Depends(get_postgres_conn),
+    db: LazyConnection = Depends(get_postgres_conn),
     redis: Redis = Depends(get_redis),
 ):
     claims = auth_service.validate_access_token(
@@ -108,3 +127,176 @@ async def delete_user(
 
         await user_service.delete_user(user_id=user_id, db=db)
         auth_service.set_access_token_min_issue_date(user_id=user_id, redis=redis)
+
+
+@router.get(
+    path="/me/shipping-details",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ShippingDetailModel],
+    summary="Get my saved addresses",
+)
+async def get_shipping_details(
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.checkout():
+        return await order_service.get_shipping_details(user_id=claims["sub"], db=db)
+
+
+@router.post(
+    path="/me/shipping-details",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ShippingDetailModel,
+    summary="Save an address",
+)
+async def register_shipping_detail(
+    shipping_detail_registration_model: ShippingDetailRegistrationModel,
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.transaction():
+        return await order_service.register_shipping_detail(
+            user_id=claims["sub"], address=shipping_detail_registration_model.address, db=db
+        )
+
+
+@router.delete(
+    path="/me/shipping-details/{shipping_detail_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=None,
+    summary="Remove a saved address",
+)
+async def remove_shipping_detail(
+    shipping_detail_id: int,
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.transaction():
+        removed = await order_service.remove_shipping_detail(
+            shipping_detail_id=shipping_detail_id, user_id=claims["sub"], db=db
+        )
+
+    if not removed:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="shipping detail not found.")
+
+
+@router.get(
+    path="/me/payment-details",
+    status_code=status.HTTP_200_OK,
+    response_model=list[PaymentProfileModel],
+    summary="Get my saved payment profiles",
+)
+async def get_payment_profiles(
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_read_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.checkout():
+        return await order_service.get_payment_profiles(user_id=claims["sub"], db=db)
+
+
+@router.post(
+    path="/me/payment-details",
+    status_code=status.HTTP_201_CREATED,
+    response_model=PaymentProfileModel,
+    summary="Save a payment profile",
+)
+async def register_payment_detail(
+    payment_detail_registration_model: PaymentDetailRegistrationModel,
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.transaction():
+        payment_detail_model = await order_service.register_payment_detail(
+            user_id=claims["sub"],
+            card_number=payment_detail_registration_model.card_number,
+            cvv=payment_detail_registration_model.cvv,
+            db=db,
+        )
+
+    return PaymentProfileModel(id=payment_detail_model.id, last_four=payment_detail_model.card_number[-4:])
+
+
+@router.delete(
+    path="/me/payment-details/{payment_detail_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=None,
+    summary="Remove a saved payment profile",
+)
+async def remove_payment_detail(
+    payment_detail_id: int,
+    access_token: str = Depends(get_access_token),
+    order_service: OrderService = Depends(),
+    auth_service: AuthService = Depends(),
+    settings: Settings = Depends(get_settings),
+    redis: Redis = Depends(get_redis),
+    db: LazyConnection = Depends(get_postgres_conn),
+):
+    claims = auth_service.validate_access_token(
+        access_token=access_token, key=settings.JWT_KEY, algorithm=settings.JWT_ALGORITHM, redis=redis
+    )
+
+    if not claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token.")
+
+    async with db.transaction():
+        removed = await order_service.remove_payment_detail(
+            payment_detail_id=payment_detail_id, user_id=claims["sub"], db=db
+        )
+
+    if not removed:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="payment detail not found.")
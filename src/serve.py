@@ -0,0 +1,36 @@
+import os
+
+import uvicorn
+from config.settings import Settings
+
+
+def get_available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return cpus
+
+
+if __name__ == "__main__":
+    # Workers build their own Settings, so the worker count has to be visible to them for pool sizing.
+    os.environ.setdefault("WEB_CONCURRENCY", str(get_available_cpus()))
+    settings = Settings()  # type: ignore
+
+    print(f"Starting {settings.WEB_CONCURRENCY} workers")
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WEB_CONCURRENCY,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+    )
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import asyncpg
+from fastapi import Depends
+from models import CategoryRevenueModel, LowStockItemModel, TopSellerModel
+from repositories.analytics_repository import AnalyticsRepository
+from repositories.order_repository import OrderRepository
+from states import LazyConnection
+
+
+class AnalyticsService:
+    def __init__(
+        self,
+        analytics_repository: AnalyticsRepository = Depends(),
+        order_repository: OrderRepository = Depends(),
+    ):
+        self.analytics_repository = analytics_repository
+        self.order_repository = order_repository
+
+    async def update_sales_rollups(self, payload: dict, db: asyncpg.Connection) -> None:
+        # Runs as a job, whose removal commits with these increments, so each order is counted exactly once.
+        order = await self.order_repository.get_order(
+            order_id=payload["order_id"], db=db, order_date=datetime.fromisoformat(payload["order_date"])
+        )
+
+        if not order or not order["summary"]:
+            return
+
+        item_models = order["summary"]["item_models"]
+        units = [item_model["qty"] for item_model in item_models]
+        revenues = [Decimal(str(item_model["price"])) * item_model["qty"] for item_model in item_models]
+
+        await self.analytics_repository.add_item_sales(
+            order_date=order["order_date"],
+            item_ids=[item_model["id"] for item_model in item_models],
+            units=units,
+            revenues=revenues,
+            db=db,
+        )
+        await self.analytics_repository.add_category_sales(
+            order_date=order["order_date"],
+            categories=[item_model["category"] for item_model in item_models],
+            units=units,
+            revenues=revenues,
+            db=db,
+        )
+
+    @staticmethod
+    def get_since(days: int) -> date:
+        return datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+    async def get_top_sellers(self, days: int, order_by: str, limit: int, db: LazyConnection) -> list[TopSellerModel]:
+        top_sellers = await self.analytics_repository.get_top_sellers(
+            since=self.get_since(days), until=datetime.now(timezone.utc).date(), order_by=order_by, limit=limit, db=db
+        )
+        return [TopSellerModel(**dict(top_seller)) for top_seller in top_sellers]
+
+    async def get_category_revenue(
+        self, days: int, category: str | None, db: LazyConnection
+    ) -> list[CategoryRevenueModel]:
+        category_revenue = await self.analytics_repository.get_category_revenue(
+            since=self.get_since(days), until=datetime.now(timezone.utc).date(), category=category, db=db
+        )
+        return [CategoryRevenueModel(**dict(row)) for row in category_revenue]
+
+    async def get_low_stock_items(self, threshold: int, days: int, db: LazyConnection) -> list[LowStockItemModel]:
+        low_stock_items = await self.analytics_repository.get_low_stock_items(
+            threshold=threshold, since=self.get_since(days), days=days, db=db
+        )
+        low_stock_item_models = []
+
+        for item in low_stock_items:
+            days_left = item["qty"] / item["daily_units"] if item["daily_units"] else None
+            low_stock_item_models.append(LowStockItemModel(**dict(item), days_left=days_left))
+
+        return low_stock_item_models
@@ -3,16 +3,35 @@ import uuid
 
 import jwt
 import redis
+from circuit_breaker import redis_unavailable_errors
+from config.settings import Settings
+from fastapi import Depends
 from models import AccessTokenModel
+from revocation_cache import RevocationCache
+from states import get_revocation_cache, get_settings
 
 
 class AuthService:
+    def __init__(
+        self,
+        revocation_cache: RevocationCache = Depends(get_revocation_cache),
+        settings: Settings = Depends(get_settings),
+    ):
+        self.revocation_cache = revocation_cache
+        self.degraded_policy = settings.AUTH_DEGRADED_POLICY
+
     def invoke_access_token(self, tid: str, redis: redis.Redis) -> None:
-        redis.set(f"invalid_access_token:{tid}", "1", 3600)
+        pipeline = redis.pipeline()
+        pipeline.set(f"invalid_access_token:{tid}", "1", 3600)
+        self.revocation_cache.revoke(f"tid:{tid}", 3600, pipeline)
+        pipeline.execute()
 
     def set_access_token_min_issue_date(self, user_id: int, redis: redis.Redis) -> None:
         curr_unix_time = int(time.time())
-        redis.set(f"user:{user_id}:access_token_min_issue_date", curr_unix_time, 3600)
+        pipeline = redis.pipeline()
+        pipeline.set(f"user:{user_id}:access_token_min_issue_date", curr_unix_time, 3600)
+        self.revocation_cache.revoke(f"user:{user_id}:{curr_unix_time}", 3600, pipeline)
+        pipeline.execute()
 
     def create_access_token(self, user_id: int, key: str, algorithm: str) -> AccessTokenModel:
         tid = str(uuid.uuid4())
@@ -34,7 +53,14 @@ class AuthService:
         pipeline = redis.pipeline()
         pipeline.get(f"invalid_access_token:{tid}")
         pipeline.get(f"user:{user_id}:access_token_min_issue_date")
-        res = pipeline.execute()
+        try:
+            res = pipeline.execute()
+        except redis_unavailable_errors:
+            if self.degraded_policy != "local":
+                raise
+
+            # The signature and expiry were checked above, so only revocations are left, from the local copy.
+            return None if self.revocation_cache.is_revoked(user_id, tid, issue_date) else claims
         invalid_access_token, access_token_min_issue_date = res[0], res[1]
 
         if invalid_access_token:
@@ -1,14 +1,46 @@
 import asyncpg
+import redis
+from config.settings import Settings
 from fastapi import Depends
 from models import CartSummaryModel, ItemModel
 from repositories.cart_repository import CartRepository
+from repositories.item_repository import ItemRepository
+from repositories.redis_cart_repository import RedisCartRepository
+from states import LazyConnection, get_redis, get_settings
 
 
 class CartService:
-    def __init__(self, cart_repository: CartRepository = Depends()):
+    def __init__(
+        self,
+        cart_repository: CartRepository = Depends(),
+        redis_cart_repository: RedisCartRepository = Depends(),
+        item_repository: ItemRepository = Depends(),
+        settings: Settings = Depends(get_settings),
+        redis: redis.Redis = Depends(get_redis),
+    ):
         self.cart_repository = cart_repository
+        self.redis_cart_repository = redis_cart_repository
+        self.item_repository = item_repository
+        self.uses_redis = settings.CART_STORAGE == "redis"
+        self.redis = redis
+
+    def transaction(self, db: LazyConnection):
+        # Redis carts only touch Postgres to load a cart the first time, so no transaction is held open for them.
+        return db.checkout() if self.uses_redis else db.transaction()
+
+    async def load_redis_cart(self, user_id: int, db: LazyConnection) -> None:
+        if not self.redis_cart_repository.is_hydrated(user_id=user_id, redis=self.redis):
+            qtys = await self.cart_repository.get_cart_qtys(user_id=user_id, db=db)
+            self.redis_cart_repository.hydrate_cart(user_id=user_id, qtys=qtys, redis=self.redis)
+
+    async def add_item(self, item_id: int, qty: int, user_id: int, db: LazyConnection) -> None:
+        if self.uses_redis:
+            await self.load_redis_cart(user_id=user_id, db=db)
+            self.redis_cart_repository.update_qty(
+                item_id=item_id, qty=qty, user_id=user_id, must_exist=False, redis=self.redis
+            )
+            return
 
-    async def add_item(self, item_id: int, qty: int, user_id: int, db: asyncpg.Connection) -> None:
         item = await self.cart_repository.get_item(item_id=item_id, user_id=user_id, db=db)
 
         if not item:
@@ -16,7 +48,14 @@ class CartService:
         else:
             await self.cart_repository.increase_qty(item_id=item_id, qty=qty, user_id=user_id, db=db)
 
-    async def remove_item(self, item_id: int, qty: int, user_id: int, db: asyncpg.Connection) -> bool:
+    async def remove_item(self, item_id: int, qty: int, user_id: int, db: LazyConnection) -> bool:
+        if self.uses_redis:
+            await self.load_redis_cart(user_id=user_id, db=db)
+            remaining_qty = self.redis_cart_repository.update_qty(
+                item_id=item_id, qty=-qty, user_id=user_id, must_exist=True, redis=self.redis
+            )
+            return remaining_qty is not None
+
         item = await self.cart_repository.get_item(item_id=item_id, user_id=user_id, db=db)
 
         if not item:
@@ -26,10 +65,28 @@ class CartService:
         await self.cart_repository.clean_up(item_id=item_id, user_id=user_id, db=db)
         return True
 
-    async def clear_cart(self, user_id: int, db: asyncpg.Connection) -> None:
+    async def clear_cart(self, user_id: int, db: LazyConnection) -> None:
+        if self.uses_redis:
+            self.redis_cart_repository.clear_cart(user_id=user_id, redis=self.redis)
+            return
+
         await self.cart_repository.clear_cart(user_id=user_id, db=db)
 
-    async def get_items(self, user_id: int, db: asyncpg.Connection) -> list[ItemModel]:
+    async def get_redis_cart(self, user_id: int, db: LazyConnection) -> list[tuple[asyncpg.Record, int]]:
+        await self.load_redis_cart(user_id=user_id, db=db)
+        qtys = self.redis_cart_repository.get_cart(user_id=user_id, redis=self.redis)
+
+        if not qtys:
+            return []
+
+        items = await self.item_repository.get_items(item_ids=list(qtys), db=db)
+        return [(item, qtys[item["id"]]) for item in items]
+
+    async def get_items(self, user_id: int, db: LazyConnection) -> list[ItemModel]:
+        if self.uses_redis:
+            cart = await self.get_redis_cart(user_id=user_id, db=db)
+            return [ItemModel(**{**dict(item), "qty": qty}) for item, qty in cart]
+
         cart = await self.cart_repository.get_cart(user_id=user_id, db=db)
         item_models = []
         for item in cart:
@@ -38,7 +95,11 @@ class CartService:
 
         return item_models
 
-    async def get_total(self, user_id: int, db: asyncpg.Connection) -> float:
+    async def get_total(self, user_id: int, db: LazyConnection) -> float:
+        if self.uses_redis:
+            cart = await self.get_redis_cart(user_id=user_id, db=db)
+            return sum(item["price"] * qty for item, qty in cart)
+
         total = await self.cart_repository.get_total(user_id=user_id, db=db)
 
         if not total:
@@ -46,7 +107,13 @@ class CartService:
 
         return total["total"]
 
-    async def get_cart_summary(self, user_id: int, db: asyncpg.Connection) -> CartSummaryModel:
-        total = await self.get_total(user_id=user_id, db=db)
-        item_models = await self.get_items(user_id=user_id, db=db)
-        return CartSummaryModel(item_models=item_models, total=total)
+    async def get_cart_summary(self, user_id: int, db: LazyConnection) -> CartSummaryModel:
+        if self.uses_redis:
+            cart = await self.get_redis_cart(user_id=user_id, db=db)
+            item_models = [ItemModel(**{**dict(item), "qty": qty}) for item, qty in cart]
+            return CartSummaryModel(item_models=item_models, total=sum(item["price"] * qty for item, qty in cart))
+
+        # Both come from one read, so the total always matches the items listed.
+        cart = await self.cart_repository.get_cart(user_id=user_id, db=db)
+        item_models = [ItemModel(**dict(item)) for item in cart]
+        return CartSummaryModel(item_models=item_models, total=sum(item["price"] * item["qty"] for item in cart))
@@ -0,0 +1,118 @@
+import uuid
+
+import asyncpg
+import redis
+from config.settings import Settings
+from fastapi import Depends
+from models import ItemModel
+from repositories.flash_sale_repository import FlashSaleRepository
+from repositories.item_repository import ItemRepository
+from repositories.job_repository import JobRepository
+from states import DatabaseConnection, get_redis, get_settings
+
+
+class FlashSaleService:
+    def __init__(
+        self,
+        flash_sale_repository: FlashSaleRepository = Depends(),
+        item_repository: ItemRepository = Depends(),
+        job_repository: JobRepository = Depends(),
+        settings: Settings = Depends(get_settings),
+        redis: redis.Redis = Depends(get_redis),
+    ):
+        self.flash_sale_repository = flash_sale_repository
+        self.item_repository = item_repository
+        self.job_repository = job_repository
+        self.reservation_ttl = settings.FLASH_SALE_RESERVATION_TTL
+        self.redis = redis
+
+    async def get_pending_qtys(self, db: DatabaseConnection) -> tuple[dict[int, int], set[str]]:
+        # Stock sold in Redis but not yet taken off the items row, along with the reservations it came from.
+        pending_qtys = {}
+        reservation_ids = set()
+
+        for payload in await self.job_repository.get_job_payloads(kind="commit_flash_sale", db=db):
+            reservation_ids.add(payload["reservation_id"])
+            for item_id, qty in payload["items"].items():
+                pending_qtys[int(item_id)] = pending_qtys.get(int(item_id), 0) + qty
+
+        return pending_qtys, reservation_ids
+
+    async def start_flash_sale(self, item_id: int, db: DatabaseConnection) -> int | None:
+        item = await self.item_repository.get_item(item_id=item_id, db=db)
+
+        if not item:
+            return None
+
+        pending_qtys, _ = await self.get_pending_qtys(db=db)
+        stock = item["qty"] - pending_qtys.get(item_id, 0)
+
+        if not self.flash_sale_repository.start_flash_sale(item_id=item_id, stock=stock, redis=self.redis):
+            return None
+
+        return stock
+
+    def end_flash_sale(self, item_id: int) -> bool:
+        return self.flash_sale_repository.end_flash_sale(item_id=item_id, redis=self.redis)
+
+    def get_flash_sales(self) -> list[dict]:
+        item_ids = self.flash_sale_repository.get_all_flash_sale_items(redis=self.redis)
+        stocks, reservations = self.flash_sale_repository.get_stock(item_ids=item_ids, redis=self.redis)
+
+        return [
+            {
+                "item_id": item_id,
+                "stock": stocks.get(item_id),
+                "reserved": sum(items.get(item_id, 0) for items in reservations.values()),
+            }
+            for item_id in item_ids
+        ]
+
+    def get_flash_sale_qtys(self, item_models: list[ItemModel]) -> dict[int, int]:
+        item_ids = self.flash_sale_repository.get_flash_sale_items(
+            item_ids=[item_model.id for item_model in item_models], redis=self.redis
+        )
+        return {item_model.id: item_model.qty for item_model in item_models if item_model.id in item_ids}
+
+    def reserve(self, qtys: dict[int, int]) -> tuple[str, tuple[int, int] | None]:
+        reservation_id = str(uuid.uuid4())
+        shortage = self.flash_sale_repository.reserve_stock(
+            reservation_id=reservation_id, qtys=qtys, ttl=self.reservation_ttl, redis=self.redis
+        )
+        return reservation_id, shortage
+
+    def confirm(self, reservation_id: str) -> None:
+        self.flash_sale_repository.confirm_reservation(reservation_id=reservation_id, redis=self.redis)
+
+    def release(self, reservation_id: str) -> None:
+        self.flash_sale_repository.release_reservation(reservation_id=reservation_id, redis=self.redis)
+
+    async def hold_reservation(self, reservation_id: str, db: DatabaseConnection) -> bool:
+        # Taken inside the checkout's transaction and held until it ends, so the reservation cannot be settled
+        # while its order may still commit. False if it was already released, having expired before this.
+        await self.flash_sale_repository.lock_reservation(reservation_id=reservation_id, db=db)
+        return self.flash_sale_repository.has_reservation(reservation_id=reservation_id, redis=self.redis)
+
+    async def settle_reservation(self, reservation_id: str, db: DatabaseConnection) -> str:
+        # Run in a transaction. Once the checkout's lock is free its transaction has ended, and its commit job
+        # shows whether the order committed: then the stock stays sold, otherwise it goes back on sale.
+        if not await self.flash_sale_repository.try_lock_reservation(reservation_id=reservation_id, db=db):
+            return "held"
+
+        if await self.job_repository.has_job(
+            kind="commit_flash_sale", payload={"reservation_id": reservation_id}, db=db
+        ):
+            self.confirm(reservation_id)
+            return "committed"
+
+        self.release(reservation_id)
+        return "released"
+
+    async def commit_flash_sale(self, payload: dict, db: asyncpg.Connection) -> None:
+        for item_id, qty in sorted(payload["items"].items(), key=lambda item: int(item[0])):
+            if not await self.item_repository.decrease_qty(item_id=int(item_id), qty=qty, db=db):
+                # Retried rather than taking the items row below zero, and left failed for a look if it stays short.
+                raise ValueError(f"Item {item_id} has less than {qty} left for reservation {payload['reservation_id']}")
+
+        # Also confirmed here in case the checkout that reserved it died between its commit and its own confirm.
+        self.confirm(payload["reservation_id"])
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+import redis
+from config.settings import Settings
+from fastapi import Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from states import get_settings
+
+# Deletes the key only while it still holds this request's in-flight record.
+release_script = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+"""
+
+# A conflict or rate limit may clear on a retry, so it is not replayed for the rest of the key's life.
+retryable_status_codes = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+class IdempotencyService:
+    def __init__(self, settings: Settings = Depends(get_settings)):
+        self.settings = settings
+
+    def get_fingerprint(self, model: BaseModel) -> str:
+        return hashlib.sha256(model.model_dump_json().encode()).hexdigest()
+
+    def store(self, key: str, fingerprint: str, status_code: int, body, redis: redis.Redis) -> None:
+        record = {"state": "completed", "fingerprint": fingerprint, "status_code": status_code, "body": body}
+        redis.set(key, json.dumps(record), self.settings.IDEMPOTENCY_TTL)
+
+    def release(self, key: str, in_flight_record: str, redis: redis.Redis) -> None:
+        redis.register_script(release_script)(keys=[key], args=[in_flight_record])
+
+    async def replay(self, key: str, fingerprint: str, redis: redis.Redis) -> JSONResponse | None:
+        deadline = time.monotonic() + self.settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        # A duplicate waits for the attempt in flight instead of running the request again in parallel.
+        while True:
+            record = redis.get(key)
+
+            if record is None:
+                return None
+
+            record = json.loads(record)  # type: ignore
+
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency key was already used for a different request.",
+                )
+
+            if record["state"] == "completed":
+                return JSONResponse(
+                    status_code=record["status_code"], content=record["body"], headers={"Idempotent-Replayed": "true"}
+                )
+
+            if time.monotonic() > deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this idempotency key is still in progress.",
+                )
+
+            await asyncio.sleep(0.05)
+
+    async def execute(
+        self, scope: str, idempotency_key: str | None, fingerprint: str, status_code: int, redis: redis.Redis, call
+    ):
+        if not idempotency_key:
+            return await call()
+
+        key = f"idempotency:{scope}:{idempotency_key}"
+        # The token makes the record this request's own, so it never releases a key another request has taken since.
+        in_flight_record = json.dumps({"state": "in_flight", "fingerprint": fingerprint, "token": uuid.uuid4().hex})
+
+        while not redis.set(key, in_flight_record, self.settings.IDEMPOTENCY_LOCK_TTL, nx=True):
+            response = await self.replay(key=key, fingerprint=fingerprint, redis=redis)
+            if response:
+                return response
+
+        # Only HTTP errors raised by the call release or settle the key. Any other failure, a cancellation included,
+        # may come after the call committed, so the key is kept from a retry until IDEMPOTENCY_LOCK_TTL expires it.
+        try:
+            result = await call()
+        except HTTPException as exc:
+            if exc.status_code >= 500 or exc.status_code in retryable_status_codes:
+                self.release(key, in_flight_record, redis)
+            else:
+                self.store(key, fingerprint, exc.status_code, {"detail": exc.detail}, redis)
+            raise
+
+        self.store(key, fingerprint, status_code, jsonable_encoder(result), redis)
+        return result
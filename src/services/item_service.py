@@ -1,28 +1,130 @@
 import asyncpg
+from catalog import CatalogSnapshot, ItemNameIndex
+from data_loader import DataLoader
 from fastapi import Depends
-from models import ItemModel, ItemRatingModel
+from models import CatalogVersionModel, ItemModel, ItemRatingModel
 from repositories.item_repository import ItemRepository
+from single_flight import SingleFlight
+from states import LazyConnection, get_catalog_snapshot, get_item_name_index, get_item_single_flight
 
 
 class ItemService:
-    def __init__(self, item_repository: ItemRepository = Depends()):
+    def __init__(
+        self,
+        item_repository: ItemRepository = Depends(),
+        item_name_index: ItemNameIndex = Depends(get_item_name_index),
+        catalog_snapshot: CatalogSnapshot | None = Depends(get_catalog_snapshot),
+        item_single_flight: SingleFlight = Depends(get_item_single_flight),
+    ):
         self.item_repository = item_repository
-
-    async def register_item(
-        self, name: str, price: float, category: str, qty: int, db: asyncpg.Connection
-    ) -> ItemModel:
+        self.item_name_index = item_name_index
+        self.catalog_snapshot = catalog_snapshot
+        self.item_single_flight = item_single_flight
+        # Services are built once per request, so get_item calls from one request are batched together.
+        self.item_loader = DataLoader(self.load_items)
+
+    def can_use_catalog_snapshot(self, db: LazyConnection) -> bool:
+        # Reads inside a transaction, such as the stock checks at checkout, must see the database.
+        return self.catalog_snapshot is not None and self.catalog_snapshot.is_fresh() and not db.is_in_transaction()
+
+    async def fetch_shared(self, key: tuple, db: LazyConnection, call):
+        # Identical concurrent reads share one query. A caller already holding a connection, such as one inside a
+        # transaction, which must see its own snapshot, reads on it: waiting on a shared read that still has to
+        # acquire a connection could starve the pool.
+        if db.conn is not None:
+            return await call(db)
+
+        async def shared_call():
+            # On a connection of its own, so a caller going away cannot release one the others still read on.
+            fork = LazyConnection(db.pool, db.slow_query_log)
+            async with fork.checkout():
+                return await call(fork)
+
+        # Keyed by pool as well, so a caller reading its own writes on the primary never gets a replica's result.
+        return await self.item_single_flight.do((id(db.pool), *key), shared_call)
+
+    async def load_items(self, item_ids: list[int], db: LazyConnection) -> dict[int, asyncpg.Record]:
+        if len(item_ids) == 1:
+            item_id = item_ids[0]
+            item = await self.fetch_shared(
+                ("item", item_id), db, lambda conn: self.item_repository.get_item(item_id=item_id, db=conn)
+            )
+            return {item_id: item} if item else {}
+
+        items = await self.item_repository.get_items(item_ids=item_ids, db=db)
+        return {item["id"]: item for item in items}
+
+    async def register_item(self, name: str, price: float, category: str, qty: int, db: LazyConnection) -> ItemModel:
         item = await self.item_repository.register_item(name=name, price=price, category=category, qty=qty, db=db)
+        self.item_name_index.add(name)
         return ItemModel(**dict(item))  # type: ignore
 
-    async def get_item(self, item_id: int, db: asyncpg.Connection) -> ItemModel | None:
-        item = await self.item_repository.get_item(item_id=item_id, db=db)
+    async def get_item(self, item_id: int, db: LazyConnection) -> ItemModel | None:
+        if self.can_use_catalog_snapshot(db):
+            return self.catalog_snapshot.get_item(item_id)  # type: ignore
+
+        item = await self.item_loader.load(item_id, db)
 
         if not item:
             return None
 
         return ItemModel(**dict(item))
 
-    async def get_qty(self, item_id: int, db: asyncpg.Connection) -> int:
+    async def get_items(self, item_ids: list[int], db: LazyConnection) -> list[ItemModel]:
+        item_ids = list(dict.fromkeys(item_ids))
+
+        if self.can_use_catalog_snapshot(db):
+            item_models = [self.catalog_snapshot.get_item(item_id) for item_id in item_ids]  # type: ignore
+            return [item_model for item_model in item_models if item_model]
+
+        items = await self.item_loader.load_many(item_ids, db)
+        item_models = []
+
+        for item in items:
+            if item:
+                item_model = ItemModel(**dict(item))
+                item_models.append(item_model)
+
+        return item_models
+
+    async def get_item_version(self, item_id: int, db: LazyConnection) -> CatalogVersionModel | None:
+        if self.can_use_catalog_snapshot(db):
+            item_version = self.catalog_snapshot.get_item_version(item_id)  # type: ignore
+        else:
+            item_version = await self.fetch_shared(
+                ("item_version", item_id),
+                db,
+                lambda conn: self.item_repository.get_item_version(item_id=item_id, db=conn),
+            )
+
+        if not item_version:
+            return None
+
+        return CatalogVersionModel(etag=f'"{item_version["version"]}"', last_modified=item_version["updated_at"])
+
+    async def get_catalog_version(self, db: LazyConnection, category: str | None = None) -> CatalogVersionModel:
+        if self.can_use_catalog_snapshot(db):
+            if category is None:
+                catalog_version = self.catalog_snapshot.get_catalog_version()  # type: ignore
+            else:
+                catalog_version = self.catalog_snapshot.get_category_version(category)  # type: ignore
+        elif category is None:
+            catalog_version = await self.fetch_shared(
+                ("catalog_version",), db, lambda conn: self.item_repository.get_catalog_version(db=conn)
+            )
+        else:
+            catalog_version = await self.fetch_shared(
+                ("category_version", category),
+                db,
+                lambda conn: self.item_repository.get_category_version(category=category, db=conn),
+            )
+
+        # No Last-Modified here: the newest updated_at does not follow commit order, so only the ETag is reliable.
+        return CatalogVersionModel(
+            etag=f'"{catalog_version["count"]}-{int(catalog_version["version"]) % 2**64:x}"', last_modified=None
+        )
+
+    async def get_qty(self, item_id: int, db: LazyConnection) -> int:
         item_model = await self.get_item(item_id=item_id, db=db)
 
         if not item_model:
@@ -30,11 +132,15 @@ class ItemService:
 
         return item_model.qty
 
-    async def remove_item(self, item_id: int, db: asyncpg.Connection) -> None:
+    async def remove_item(self, item_id: int, name: str, db: LazyConnection) -> None:
         await self.item_repository.remove_item(item_id=item_id, db=db)
+        self.item_name_index.remove(name)
 
-    async def get_all_items(self, db: asyncpg.Connection) -> list[ItemModel]:
-        items = await self.item_repository.get_all_items(db=db)
+    async def get_all_items(self, db: LazyConnection) -> list[ItemModel]:
+        if self.can_use_catalog_snapshot(db):
+            return self.catalog_snapshot.get_all_items()  # type: ignore
+
+        items = await self.fetch_shared(("all_items",), db, lambda conn: self.item_repository.get_all_items(db=conn))
         item_models = []
 
         for item in items:
@@ -43,8 +149,15 @@ class ItemService:
 
         return item_models
 
-    async def get_items_by_category(self, category: str, db: asyncpg.Connection) -> list[ItemModel]:
-        items = await self.item_repository.get_items_by_category(category=category, db=db)
+    async def get_items_by_category(self, category: str, db: LazyConnection) -> list[ItemModel]:
+        if self.can_use_catalog_snapshot(db):
+            return self.catalog_snapshot.get_items_by_category(category)  # type: ignore
+
+        items = await self.fetch_shared(
+            ("category", category),
+            db,
+            lambda conn: self.item_repository.get_items_by_category(category=category, db=conn),
+        )
         item_models = []
 
         for item in items:
@@ -52,16 +165,26 @@ class ItemService:
             item_models.append(item_model)
         return item_models
 
-    async def decrease_qty(self, item_id: int, qty: int, db: asyncpg.Connection) -> None:
-        await self.item_repository.decrease_qty(item_id=item_id, qty=qty, db=db)
+    async def search_items(self, keyword: str, limit: int, offset: int, db: LazyConnection) -> list[ItemModel]:
+        items = await self.item_repository.search_items(keyword=keyword, limit=limit, offset=offset, db=db)
+        item_models = []
 
-    async def increase_qty(self, item_id: int, qty: int, db: asyncpg.Connection) -> None:
-        await self.item_repository.increase_qty(item_id=item_id, qty=qty, db=db)
+        for item in items:
+            item_model = ItemModel(**dict(item))
+            item_models.append(item_model)
+
+        return item_models
 
-    async def register_item_rating(self, item_id: int, rating: int, db: asyncpg.Connection) -> None:
-        await self.item_repository.register_item_rating(item_id=item_id, rating=rating, db=db)
+    def autocomplete(self, prefix: str, limit: int) -> list[str]:
+        return self.item_name_index.complete(prefix=prefix, limit=limit)
+
+    async def decrease_qty(self, item_id: int, qty: int, db: LazyConnection) -> bool:
+        return await self.item_repository.decrease_qty(item_id=item_id, qty=qty, db=db)
+
+    async def increase_qty(self, item_id: int, qty: int, db: LazyConnection) -> None:
+        await self.item_repository.increase_qty(item_id=item_id, qty=qty, db=db)
 
-    async def get_item_ratings(self, item_id: int, db: asyncpg.Connection) -> list[ItemRatingModel]:
+    async def get_item_ratings(self, item_id: int, db: LazyConnection) -> list[ItemRatingModel]:
         item_rating_models = []
 
         item_ratings = await self.item_repository.get_item_ratings(item_id=item_id, db=db)
@@ -0,0 +1,21 @@
+from fastapi import Depends
+from repositories.job_repository import JobRepository
+from states import LazyConnection
+
+
+class JobService:
+    def __init__(self, job_repository: JobRepository = Depends()):
+        self.job_repository = job_repository
+
+    async def enqueue(
+        self, kind: str, payload: dict, db: LazyConnection, delay: float = 0, max_attempts: int = 5
+    ) -> None:
+        await self.job_repository.enqueue(kind=kind, payload=payload, delay=delay, max_attempts=max_attempts, db=db)
+
+    async def get_job_counts(self, db: LazyConnection) -> dict:
+        job_counts = {}
+
+        for job_count in await self.job_repository.get_job_counts(db=db):
+            job_counts.setdefault(job_count["kind"], {})[job_count["status"]] = job_count["count"]
+
+        return job_counts
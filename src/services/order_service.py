@@ -1,3 +1,5 @@
+from datetime import datetime
+
 import asyncpg
 from fastapi import Depends
 from models import (
@@ -6,56 +8,104 @@ from models import (
     OrderModel,
     OrderSummaryModel,
     PaymentDetailModel,
+    PaymentProfileModel,
     ShippingDetailModel,
 )
 from repositories.order_repository import OrderRepository
+from states import DatabaseConnection, LazyConnection
 
 
 class OrderService:
     def __init__(self, order_repository: OrderRepository = Depends()):
         self.order_repository = order_repository
 
-    async def register_shipping_detail(self, address: str, db: asyncpg.Connection) -> ShippingDetailModel:
-        shipping_detail = await self.order_repository.register_shipping_detail(address=address, db=db)
+    async def register_shipping_detail(self, user_id: int, address: str, db: LazyConnection) -> ShippingDetailModel:
+        shipping_detail = await self.order_repository.register_shipping_detail(user_id=user_id, address=address, db=db)
         return ShippingDetailModel(**dict(shipping_detail))
 
-    async def register_payment_detail(self, card_number: str, cvv: str, db: asyncpg.Connection) -> PaymentDetailModel:
-        payment_detail = await self.order_repository.register_payment_detail(card_number=card_number, cvv=cvv, db=db)
+    async def register_payment_detail(
+        self, user_id: int, card_number: str, cvv: str, db: LazyConnection
+    ) -> PaymentDetailModel:
+        payment_detail = await self.order_repository.register_payment_detail(
+            user_id=user_id, card_number=card_number, cvv=cvv, db=db
+        )
         return PaymentDetailModel(**dict(payment_detail))
 
+    async def get_shipping_details(self, user_id: int, db: LazyConnection) -> list[ShippingDetailModel]:
+        shipping_details = await self.order_repository.get_shipping_details(user_id=user_id, db=db)
+        return [ShippingDetailModel(**dict(shipping_detail)) for shipping_detail in shipping_details]
+
+    async def get_payment_profiles(self, user_id: int, db: LazyConnection) -> list[PaymentProfileModel]:
+        payment_details = await self.order_repository.get_payment_details(user_id=user_id, db=db)
+        return [
+            PaymentProfileModel(id=payment_detail["id"], last_four=payment_detail["card_number"][-4:])
+            for payment_detail in payment_details
+        ]
+
+    async def get_saved_detail_ids(
+        self, shipping_detail_id: int | None, payment_detail_id: int | None, user_id: int, db: LazyConnection
+    ) -> tuple[int | None, int | None]:
+        saved_detail_ids = await self.order_repository.get_saved_detail_ids(
+            shipping_detail_id=shipping_detail_id, payment_detail_id=payment_detail_id, user_id=user_id, db=db
+        )
+        return saved_detail_ids["shipping_detail_id"], saved_detail_ids["payment_detail_id"]
+
+    async def remove_shipping_detail(self, shipping_detail_id: int, user_id: int, db: LazyConnection) -> bool:
+        return await self.order_repository.remove_shipping_detail(
+            shipping_detail_id=shipping_detail_id, user_id=user_id, db=db
+        )
+
+    async def remove_payment_detail(self, payment_detail_id: int, user_id: int, db: LazyConnection) -> bool:
+        return await self.order_repository.remove_payment_detail(
+            payment_detail_id=payment_detail_id, user_id=user_id, db=db
+        )
+
     async def register_order(
-        self, total: float, user_id: int, shipping_detail_id: int, payment_detail_id: int, db: asyncpg.Connection
+        self,
+        total: float,
+        user_id: int,
+        shipping_detail_id: int,
+        payment_detail_id: int,
+        item_models: list[ItemModel],
+        db: LazyConnection,
     ) -> OrderModel:
+        # The line items and prices paid are stored on the order so that history never joins live items.
+        summary = {"item_models": [item_model.model_dump() for item_model in item_models], "total": float(total)}
         order = await self.order_repository.register_order(
             total=total,
             user_id=user_id,
             shipping_detail_id=shipping_detail_id,
             payment_detail_id=payment_detail_id,
+            summary=summary,
             db=db,
         )
 
         return OrderModel(**dict(order))
 
     async def register_order_detail(
-        self, item_id: int, qty: int, order_id: int, db: asyncpg.Connection
+        self, item_id: int, qty: int, order_id: int, order_date: datetime, db: LazyConnection
     ) -> OrderDetailModel:
         order_detail = await self.order_repository.register_order_detail(
-            item_id=item_id, qty=qty, order_id=order_id, db=db
+            item_id=item_id, qty=qty, order_id=order_id, order_date=order_date, db=db
         )
         return OrderDetailModel(**dict(order_detail))
 
-    async def get_order(self, order_id: int, db: asyncpg.Connection) -> OrderModel | None:
-        order = await self.order_repository.get_order(order_id=order_id, db=db)
+    async def get_order(
+        self, order_id: int, db: LazyConnection, order_date: datetime | None = None
+    ) -> OrderModel | None:
+        order = await self.order_repository.get_order(order_id=order_id, db=db, order_date=order_date)
 
         if not order:
             return None
 
         return OrderModel(**dict(order))
 
-    async def get_user_orders(self, user_id: int, db: asyncpg.Connection) -> list[OrderModel]:
+    async def get_user_orders(
+        self, user_id: int, db: LazyConnection, since: datetime | None = None
+    ) -> list[OrderModel]:
         order_models = []
 
-        orders = await self.order_repository.get_user_orders(user_id=user_id, db=db)
+        orders = await self.order_repository.get_user_orders(user_id=user_id, since=since, db=db)
 
         for order in orders:
             order_model = OrderModel(**dict(order))
@@ -63,8 +113,8 @@ class OrderService:
 
         return order_models
 
-    async def get_order_items(self, order_id: int, db: asyncpg.Connection) -> list[ItemModel]:
-        order_items = await self.order_repository.get_order_items(order_id=order_id, db=db)
+    async def get_order_items(self, order_id: int, order_date: datetime, db: DatabaseConnection) -> list[ItemModel]:
+        order_items = await self.order_repository.get_order_items(order_id=order_id, order_date=order_date, db=db)
         order_item_models = []
 
         for order_item in order_items:
@@ -73,18 +123,61 @@ class OrderService:
 
         return order_item_models
 
-    async def get_order_summary(self, order_id: int, db: asyncpg.Connection) -> OrderSummaryModel:
-        order_model = await self.get_order(order_id=order_id, db=db)
-        item_models = await self.get_order_items(order_id=order_id, db=db)
-        return OrderSummaryModel(item_models=item_models, order_model=order_model)  # type: ignore
+    async def get_order_summary_model(self, order: asyncpg.Record, db: DatabaseConnection) -> OrderSummaryModel:
+        order_model = OrderModel(**dict(order))
 
-    async def get_user_orders_summary(self, user_id: int, db: asyncpg.Connection) -> list[OrderSummaryModel]:
-        order_summary_models = []
+        if order["summary"] is None:
+            item_models = await self.get_order_items(order_id=order_model.id, order_date=order_model.order_date, db=db)
+        else:
+            item_models = [ItemModel(**item) for item in order["summary"]["item_models"]]
 
-        order_models = await self.get_user_orders(user_id=user_id, db=db)
+        return OrderSummaryModel(item_models=item_models, order_model=order_model)
 
-        for order_model in order_models:
-            order_summary_model = await self.get_order_summary(order_id=order_model.id, db=db)
-            order_summary_models.append(order_summary_model)
+    async def get_order_summary(
+        self, order_id: int, db: DatabaseConnection, order_date: datetime | None = None
+    ) -> OrderSummaryModel | None:
+        order = await self.order_repository.get_order(order_id=order_id, db=db, order_date=order_date)
+
+        if not order:
+            return None
+
+        return await self.get_order_summary_model(order=order, db=db)
+
+    async def send_order_confirmation(self, payload: dict, db: asyncpg.Connection) -> None:
+        order_date = datetime.fromisoformat(payload["order_date"]) if "order_date" in payload else None
+        order_summary_model = await self.get_order_summary(order_id=payload["order_id"], db=db, order_date=order_date)
+
+        if not order_summary_model:
+            return
+
+        order_model = order_summary_model.order_model
+        print(f"Sending order {order_model.id} confirmation to user {order_model.user_id}, total {order_model.total}")
+
+    async def get_user_orders_summary(
+        self, user_id: int, db: LazyConnection, since: datetime | None = None
+    ) -> list[OrderSummaryModel]:
+        orders = await self.order_repository.get_user_orders(user_id=user_id, since=since, db=db)
+
+        # Only orders from before summaries were stored need their items read, and those reads are independent.
+        legacy_orders = [order for order in orders if order["summary"] is None]
+        legacy_item_models = iter(
+            await db.gather(
+                *(
+                    lambda conn, order=order: self.get_order_items(
+                        order_id=order["id"], order_date=order["order_date"], db=conn
+                    )
+                    for order in legacy_orders
+                )
+            )
+        )
+
+        order_summary_models = []
+        for order in orders:
+            if order["summary"] is None:
+                item_models = next(legacy_item_models)
+            else:
+                item_models = [ItemModel(**item) for item in order["summary"]["item_models"]]
+            order_model = OrderModel(**dict(order))
+            order_summary_models.append(OrderSummaryModel(item_models=item_models, order_model=order_model))
 
         return order_summary_models
@@ -0,0 +1,38 @@
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.in_flight: dict[tuple, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def forget(self, key: tuple, future: asyncio.Future) -> None:
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+        # Retrieve the exception so it is not reported as unhandled when every caller has gone away.
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key: tuple, call):
+        self.calls += 1
+        future = self.in_flight.get(key)
+
+        if future:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(call())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self.forget(key, done))
+
+        # Shielded so one caller disconnecting does not cancel the query for everyone sharing it.
+        return await asyncio.shield(future)
+
+    def get_metrics(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight),
+            "coalesced_ratio": self.coalesced / self.calls if self.calls else 0.0,
+        }
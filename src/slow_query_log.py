@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+import time
+
+import asyncpg
+
+# Enough to tell a statement's call patterns apart without a statement passed ever-changing lists growing its entry.
+max_parameter_shapes = 10
+
+
+def get_parameter_shapes(args) -> list[str]:
+    shapes = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            shapes.append(f"{type(arg).__name__}[{len(arg)}]")
+        else:
+            shapes.append(type(arg).__name__)
+
+    return shapes
+
+
+class SlowQueryLog:
+    def __init__(
+        self, threshold: float, explain_sample_rate: float, max_statements: int, explain_timeout: float = 10.0
+    ):
+        self.threshold = threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.max_statements = max_statements
+        self.explain_timeout = explain_timeout
+        self.statements: dict[str, dict] = {}
+        self.explain_task = None
+
+    def observe(self, query: str, args, duration: float, caller: str, pool: asyncpg.Pool) -> None:
+        if duration < self.threshold:
+            return
+
+        statement = " ".join(query.split())
+        stats = self.statements.get(statement)
+
+        if stats is None:
+            if len(self.statements) >= self.max_statements:
+                # Keeps memory bounded by forgetting the statement that has cost the least so far.
+                del self.statements[min(self.statements, key=lambda s: self.statements[s]["total_time"])]
+
+            stats = self.statements[statement] = {
+                "statement": statement,
+                "callers": [],
+                "calls": 0,
+                "total_time": 0.0,
+                "max_time": 0.0,
+                "parameter_shapes": [],
+                "plan": None,
+                "plan_captured_at": None,
+            }
+
+        stats["calls"] += 1
+        stats["total_time"] += duration
+        stats["max_time"] = max(stats["max_time"], duration)
+        if caller not in stats["callers"]:
+            stats["callers"].append(caller)
+        shapes = get_parameter_shapes(args)
+        if shapes not in stats["parameter_shapes"] and len(stats["parameter_shapes"]) < max_parameter_shapes:
+            stats["parameter_shapes"].append(shapes)
+
+        print(f"Slow query ({duration * 1000:.0f} ms) in {caller}: {statement[:200]}")
+
+        # Plain EXPLAIN plans the statement without running it, so even a select with side effects, such as taking an
+        # advisory lock, is safe to sample. Only one is explained at a time.
+        if self.explain_task is None and random.random() < self.explain_sample_rate:
+            self.explain_task = asyncio.create_task(self.explain(stats, query, args, pool))
+
+    async def explain(self, stats: dict, query: str, args, pool: asyncpg.Pool) -> None:
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction(readonly=True):
+                    plan = await conn.fetchval(
+                        f"explain (format json) {query}", *args, timeout=self.explain_timeout
+                    )
+            stats["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+            stats["plan_captured_at"] = time.time()
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+            print(f"Explaining slow query failed: {exc}")
+        finally:
+            self.explain_task = None
+
+    def get_top_statements(self, limit: int) -> list[dict]:
+        statements = sorted(self.statements.values(), key=lambda stats: stats["total_time"], reverse=True)[:limit]
+        return [{**stats, "average_time": stats["total_time"] / stats["calls"]} for stats in statements]
@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.ready_at = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    async def run(self, name: str, awaitable):
+        with self.phase(name):
+            return await awaitable
+
+    def mark(self, name: str) -> None:
+        # For phases that start with the process, such as module imports.
+        self.phases[name] = time.perf_counter() - self.started_at
+
+    def finish(self) -> None:
+        self.ready_at = time.perf_counter()
+        report = ", ".join(f"{name}: {duration * 1000:.0f} ms" for name, duration in self.phases.items())
+        print(f"Ready in {(self.ready_at - self.started_at) * 1000:.0f} ms ({report})")
+
+    def get_report(self) -> dict:
+        return {
+            "ready": self.ready_at is not None,
+            "total": (self.ready_at - self.started_at) * 1000 if self.ready_at is not None else None,
+            "phases": {name: duration * 1000 for name, duration in self.phases.items()},
+        }
+
+
+startup_profiler = StartupProfiler()
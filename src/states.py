@@ -1,17 +1,36 @@
+import asyncio
+import hashlib
+import json
+import secrets
+import sys
+import time
+from contextlib import asynccontextmanager
+
 import asyncpg
+import jwt
 import redis
+from catalog import CatalogSnapshot, ItemNameIndex
+from change_feed import ItemChangeFeed
+from circuit_breaker import CircuitBreaker, CircuitBreakerRedis, redis_unavailable_errors
 from config.settings import Settings
-from fastapi import Depends, Request
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jobs import JobRunner
+from rating_buffer import RatingBuffer
+from response_cache import ResponseCache
+from revocation_cache import RevocationCache
+from single_flight import SingleFlight
+from slow_query_log import SlowQueryLog
+from tracing import SPAN_KIND_CLIENT, Tracer, query_span, span
 
 create_all_tables_query = """
-    create table users(
+    create table if not exists users(
         id serial primary key,
         username varchar(50) unique,
         password varchar(50) not null
     );
 
-    create table items(
+    create table if not exists items(
         id serial primary key,
         name varchar(25) unique,
         price numeric(10, 2) not null,
@@ -19,18 +38,23 @@ create_all_tables_query = """
         qty integer not null
     );
 
-    create table payment_details(
+    create sequence if not exists item_versions;
+    alter table items add column if not exists version bigint default nextval('item_versions') not null;
+    alter table items add column if not exists updated_at timestamptz default current_timestamp not null;
+    create index if not exists items_category_idx on items (category);
+
+    create table if not exists payment_details(
         id serial primary key,
         card_number varchar(25) not null,
         cvv varchar(25) not null
     );
 
-    create table shipping_details(
+    create table if not exists shipping_details(
         id serial primary key,
         address varchar(100) not null
     );
 
-    create table orders(
+    create table if not exists orders(
         id serial primary key,
         total numeric(10, 2) not null,
         user_id integer references users(id) on delete cascade not null,
@@ -39,68 +63,603 @@ create_all_tables_query = """
         order_date timestamptz default current_timestamp not null
     );
 
-    create table order_details(
+    create table if not exists order_details(
         item_id integer references items(id) on delete set null,
         qty integer not null,
         order_id integer references orders(id) on delete cascade,
         primary key(item_id, order_id)
     );
 
-    create table carts(
+    create table if not exists carts(
         item_id integer references items(id) on delete cascade,
         qty integer not null,
         user_id integer references users(id) on delete cascade,
         primary key(item_id, user_id)
     );
 
-    create table item_ratings(
+    create table if not exists item_ratings(
         item_id integer references items(id) on delete cascade,
         rating integer check(rating between 1 and 5) not null
     );
 
+    create or replace function notify_item_change() returns trigger as $$
+    begin
+        if tg_op = 'DELETE' then
+            perform pg_notify('item_changes', json_build_object('op', tg_op, 'item', row_to_json(old))::text);
+        else
+            perform pg_notify('item_changes', json_build_object('op', tg_op, 'item', row_to_json(new))::text);
+        end if;
+        return null;
+    end;
+    $$ language plpgsql;
+
+    do $$
+    begin
+        if not exists (select 1 from pg_trigger where tgname = 'items_notify_change') then
+            create trigger items_notify_change after insert or update or delete on items
+            for each row execute function notify_item_change();
+        end if;
+    end;
+    $$;
+
+    create table if not exists jobs(
+        id bigserial primary key,
+        kind varchar(50) not null,
+        payload jsonb not null,
+        status varchar(10) default 'pending' not null,
+        attempts integer default 0 not null,
+        max_attempts integer default 5 not null,
+        run_at timestamptz default current_timestamp not null,
+        locked_at timestamptz,
+        last_error text,
+        created_at timestamptz default current_timestamp not null
+    );
+
+    create index if not exists jobs_pending_idx on jobs (run_at) where status = 'pending';
+
+    create extension if not exists pg_trgm;
+
+    create index if not exists items_search_idx on items using gin (to_tsvector('simple', name || ' ' || category));
+    create index if not exists items_name_trgm_idx on items using gin (name gin_trgm_ops);
+    create index if not exists items_category_trgm_idx on items using gin (category gin_trgm_ops);
+
+    create table if not exists item_sales_daily(
+        day date not null,
+        item_id integer references items(id) on delete cascade not null,
+        units bigint default 0 not null,
+        revenue numeric(14, 2) default 0 not null,
+        primary key(day, item_id)
+    );
+
+    create table if not exists category_sales_daily(
+        day date not null,
+        category varchar(25) not null,
+        units bigint default 0 not null,
+        revenue numeric(14, 2) default 0 not null,
+        primary key(day, category)
+    );
+
+    create index if not exists items_qty_idx on items (qty);
+
+    alter table shipping_details add column if not exists user_id integer references users(id) on delete cascade;
+    alter table shipping_details add column if not exists detail_hash varchar(64);
+    alter table payment_details add column if not exists user_id integer references users(id) on delete cascade;
+    alter table payment_details add column if not exists detail_hash varchar(64);
+    alter table shipping_details add column if not exists archived_at timestamptz;
+    alter table payment_details add column if not exists archived_at timestamptz;
+
+    create or replace function shipping_detail_hash(address text) returns varchar as $$
+        select encode(
+            sha256(convert_to(lower(regexp_replace(btrim(address), '[[:space:]]+', ' ', 'g')), 'UTF8')), 'hex'
+        );
+    $$ language sql immutable;
+
+    create or replace function payment_detail_hash(card_number text, cvv text) returns varchar as $$
+        select encode(
+            sha256(convert_to(regexp_replace(card_number, '[^0-9]', '', 'g') || ':' || btrim(cvv), 'UTF8')), 'hex'
+        );
+    $$ language sql immutable;
 """
 
+migrations = [
+    (
+        "0001_order_summaries",
+        """
+        alter table orders add column if not exists summary jsonb;
+
+        update orders o
+        set summary = jsonb_build_object(
+            'item_models', coalesce(
+                (
+                    select jsonb_agg(
+                        jsonb_build_object(
+                            'id', i.id, 'name', i.name, 'price', i.price, 'category', i.category, 'qty', od.qty
+                        )
+                    )
+                    from order_details od
+                    join items i on od.item_id = i.id
+                    where od.order_id = o.id
+                ),
+                '[]'::jsonb
+            ),
+            'total', o.total
+        )
+        where summary is null;
+        """,
+    ),
+    (
+        "0002_partition_orders",
+        """
+        alter table orders rename to orders_legacy;
+        alter index orders_pkey rename to orders_legacy_pkey;
+        alter table order_details rename to order_details_legacy;
+        alter index order_details_pkey rename to order_details_legacy_pkey;
+
+        create table orders(
+            id integer default nextval('orders_id_seq') not null,
+            total numeric(10, 2) not null,
+            user_id integer references users(id) on delete cascade not null,
+            shipping_detail_id integer references shipping_details(id) on delete set null,
+            payment_detail_id integer references payment_details(id) on delete set null,
+            order_date timestamptz default current_timestamp not null,
+            summary jsonb,
+            primary key(id, order_date)
+        ) partition by range (order_date);
+
+        create table order_details(
+            item_id integer references items(id) on delete set null,
+            qty integer not null,
+            order_id integer not null,
+            order_date timestamptz not null,
+            primary key(item_id, order_id, order_date),
+            foreign key(order_id, order_date) references orders(id, order_date) on delete cascade
+        ) partition by range (order_date);
+
+        create index orders_user_id_order_date_idx on orders (user_id, order_date);
+        create index order_details_order_id_idx on order_details (order_id, order_date);
+
+        create table orders_default partition of orders default;
+        create table order_details_default partition of order_details default;
+
+        create or replace function create_order_partitions(start_month date, months integer) returns void as $$
+        declare
+            partition_start timestamptz;
+            partition_end timestamptz;
+            suffix text;
+        begin
+            perform pg_advisory_xact_lock(7391204554);
+            for i in 0..months - 1 loop
+                partition_start := (date_trunc('month', start_month::timestamp) + make_interval(months => i))
+                    at time zone 'UTC';
+                partition_end := (date_trunc('month', start_month::timestamp) + make_interval(months => i + 1))
+                    at time zone 'UTC';
+                suffix := to_char(partition_start at time zone 'UTC', 'YYYY_MM');
+                execute format(
+                    'create table if not exists %I partition of orders for values from (%L) to (%L)',
+                    'orders_' || suffix, partition_start, partition_end
+                );
+                execute format(
+                    'create table if not exists %I partition of order_details for values from (%L) to (%L)',
+                    'order_details_' || suffix, partition_start, partition_end
+                );
+            end loop;
+        end;
+        $$ language plpgsql;
+
+        select create_order_partitions(
+            start_month,
+            (
+                (extract(year from current_date) - extract(year from start_month)) * 12
+                + extract(month from current_date) - extract(month from start_month)
+            )::integer + 4
+        )
+        from (
+            select (coalesce(min(order_date), current_timestamp) at time zone 'UTC')::date as start_month
+            from orders_legacy
+        ) s;
+
+        insert into orders(id, total, user_id, shipping_detail_id, payment_detail_id, order_date, summary)
+        select id, total, user_id, shipping_detail_id, payment_detail_id, order_date, summary from orders_legacy;
+
+        insert into order_details(item_id, qty, order_id, order_date)
+        select od.item_id, od.qty, od.order_id, o.order_date from order_details_legacy od
+        join orders_legacy o on od.order_id = o.id;
+
+        alter sequence orders_id_seq owned by orders.id;
+        drop table order_details_legacy;
+        drop table orders_legacy;
+        """,
+    ),
+    (
+        "0003_backfill_sales_rollups",
+        """
+        insert into item_sales_daily(day, item_id, units, revenue)
+        select (o.order_date at time zone 'UTC')::date, (i->>'id')::integer,
+            sum((i->>'qty')::integer), sum((i->>'price')::numeric * (i->>'qty')::integer)
+        from orders o, jsonb_array_elements(o.summary->'item_models') i
+        where exists (select 1 from items where id = (i->>'id')::integer)
+        group by 1, 2
+        on conflict do nothing;
+
+        insert into category_sales_daily(day, category, units, revenue)
+        select (o.order_date at time zone 'UTC')::date, i->>'category',
+            sum((i->>'qty')::integer), sum((i->>'price')::numeric * (i->>'qty')::integer)
+        from orders o, jsonb_array_elements(o.summary->'item_models') i
+        group by 1, 2
+        on conflict do nothing;
+        """,
+    ),
+    (
+        "0004_archive_duplicate_saved_details",
+        """
+        update shipping_details s set user_id = o.user_id from orders o
+        where o.shipping_detail_id = s.id and s.user_id is null;
+        update shipping_details set detail_hash = shipping_detail_hash(address) where detail_hash is null;
+
+        update payment_details p set user_id = o.user_id from orders o
+        where o.payment_detail_id = p.id and p.user_id is null;
+        update payment_details set detail_hash = payment_detail_hash(card_number, cvv) where detail_hash is null;
+
+        -- Orders keep the rows they were placed with; all but the newest of each user's duplicates are archived.
+        update shipping_details s set archived_at = current_timestamp
+        from (
+            select id, row_number() over (partition by user_id, detail_hash order by id desc) as rank
+            from shipping_details where user_id is not null and archived_at is null
+        ) d
+        where s.id = d.id and d.rank > 1;
+
+        update payment_details p set archived_at = current_timestamp
+        from (
+            select id, row_number() over (partition by user_id, detail_hash order by id desc) as rank
+            from payment_details where user_id is not null and archived_at is null
+        ) d
+        where p.id = d.id and d.rank > 1;
+
+        drop index if exists shipping_details_user_hash_idx;
+        drop index if exists payment_details_user_hash_idx;
+        create unique index shipping_details_user_hash_idx on shipping_details (user_id, detail_hash)
+        where archived_at is null;
+        create unique index payment_details_user_hash_idx on payment_details (user_id, detail_hash)
+        where archived_at is null;
+        """,
+    ),
+]
+
+schema_lock_id = 7_391_204_553
+
+schema_version = hashlib.sha256(
+    "".join([create_all_tables_query, *(name for name, _ in migrations)]).encode()
+).hexdigest()[:16]
+
+replica_lag_query = """
+    select
+        case
+            when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+            else extract(epoch from now() - pg_last_xact_replay_timestamp())
+        end as lag;
+"""
+
+
 class PostgresClient:
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        replica_urls: list[str] | None = None,
+        max_replica_lag: float = 5.0,
+        lag_check_interval: float = 1.0,
+        max_connections: int = 90,
+        workers: int = 1,
+    ):
         self.url = url
         self.pool = None
+        self.pool_max_size = max(2, max_connections // max(1, workers))
+        self.pool_min_size = min(2, self.pool_max_size)
+        self.replica_urls = replica_urls or []
+        self.replica_pools = []
+        self.replica_lags = []
+        self.max_replica_lag = max_replica_lag
+        self.lag_check_interval = lag_check_interval
+        self.lag_check_task = None
+        self.next_replica = 0
+
+    async def apply_migrations(self, conn: asyncpg.Connection):
+        await conn.execute(
+            """
+            create table if not exists schema_migrations(
+                name varchar(100) primary key,
+                applied_at timestamptz default current_timestamp not null
+            );
+            """
+        )
+        applied = {row["name"] for row in await conn.fetch("select name from schema_migrations;")}
+
+        for name, query in migrations:
+            if name in applied:
+                continue
+
+            print(f"Applying migration {name}")
+            async with conn.transaction():
+                await conn.execute(query)
+                await conn.execute("insert into schema_migrations(name) values ($1);", name)
+
+    @staticmethod
+    async def is_schema_current(conn: asyncpg.Connection) -> bool:
+        if await conn.fetchval("select to_regclass('schema_migrations');") is None:
+            return False
+
+        return await conn.fetchval(
+            "select exists(select 1 from schema_migrations where name = $1);", f"schema_{schema_version}"
+        )
 
     async def create_all_tables(self):
         async with self.pool.acquire() as conn:  # type: ignore
-            await conn.execute(create_all_tables_query)
+            # Every worker runs this on boot; once this exact schema is recorded, the lock and DDL are skipped.
+            if await self.is_schema_current(conn):
+                return
+
+            await conn.execute("select pg_advisory_lock($1);", schema_lock_id)
+            try:
+                await conn.execute(create_all_tables_query)
+                await self.apply_migrations(conn)
+                await conn.execute(
+                    "insert into schema_migrations(name) values ($1) on conflict do nothing;",
+                    f"schema_{schema_version}",
+                )
+            finally:
+                await conn.execute("select pg_advisory_unlock($1);", schema_lock_id)
+
+    @staticmethod
+    async def init_connection(conn: asyncpg.Connection):
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def create_pool(self, url: str) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            url, min_size=self.pool_min_size, max_size=self.pool_max_size, init=self.init_connection
+        )  # type: ignore
+
+    async def warm_up_pool(self, pool: asyncpg.Pool, connections: int, warm_up) -> None:
+        async def warm_up_connection():
+            async with pool.acquire() as conn:
+                try:
+                    await warm_up(conn)
+                except BaseException:
+                    await barrier.abort()
+                    raise
+                # Held until every connection is open, so the pool cannot hand the same one out twice.
+                await barrier.wait()
+
+        barrier = asyncio.Barrier(connections)
+        await asyncio.gather(*(warm_up_connection() for _ in range(connections)))
+
+    async def warm_up(self, connections: int, warm_up) -> None:
+        connections = max(1, min(connections, self.pool_max_size))
+        await asyncio.gather(
+            *(self.warm_up_pool(pool, connections, warm_up) for pool in [self.pool, *self.replica_pools])
+        )
+
+    async def check_replica_lags(self):
+        for i, replica_pool in enumerate(self.replica_pools):
+            try:
+                async with replica_pool.acquire() as conn:
+                    lag = await conn.fetchval(replica_lag_query)
+                self.replica_lags[i] = float(lag) if lag is not None else float("inf")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                self.replica_lags[i] = float("inf")
+
+    async def monitor_replica_lags(self):
+        while True:
+            await asyncio.sleep(self.lag_check_interval)
+            await self.check_replica_lags()
+
+    def get_read_pool(self) -> asyncpg.Pool:
+        for _ in range(len(self.replica_pools)):
+            i = self.next_replica
+            self.next_replica = (self.next_replica + 1) % len(self.replica_pools)
+            if self.replica_lags[i] <= self.max_replica_lag:
+                return self.replica_pools[i]
+
+        return self.pool  # type: ignore
 
     async def setup(self):
-        self.pool = await asyncpg.create_pool(self.url)
+        self.pool = await self.create_pool(self.url)
         await self.create_all_tables()
 
+        for replica_url in self.replica_urls:
+            self.replica_pools.append(await self.create_pool(replica_url))
+            self.replica_lags.append(float("inf"))
+
+        if self.replica_pools:
+            await self.check_replica_lags()
+            self.lag_check_task = asyncio.create_task(self.monitor_replica_lags())
+
     async def teardown(self):
+        if self.lag_check_task:
+            self.lag_check_task.cancel()
+
+        for replica_pool in self.replica_pools:
+            await replica_pool.close()
+
         await self.pool.close()  # type: ignore
 
 
+class LazyConnection:
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        slow_query_log: SlowQueryLog | None = None,
+        max_parallel_reads: int = 1,
+        parallel_read_acquire_timeout: float = 0.05,
+        on_commit=None,
+    ):
+        self.pool = pool
+        self.slow_query_log = slow_query_log
+        self.parallel_read_acquire_timeout = parallel_read_acquire_timeout
+        self.on_commit = on_commit
+        self.conn = None
+        self.checkouts = 0
+        self.lock = asyncio.Lock()
+        self.shared_lock = asyncio.Lock()
+        self.parallel_reads = asyncio.Semaphore(max(1, max_parallel_reads))
+
+    async def acquire(self, timeout: float | None = None) -> asyncpg.Connection:
+        async with self.lock:
+            if not self.conn:
+                with span("postgres acquire", SPAN_KIND_CLIENT):
+                    self.conn = await self.pool.acquire(timeout=timeout)
+        return self.conn
+
+    async def release(self) -> None:
+        if self.conn:
+            conn, self.conn = self.conn, None
+            await self.pool.release(conn)
+
+    @asynccontextmanager
+    async def checkout(self):
+        # Statements inside the block share one connection, acquired by the first of them.
+        self.checkouts += 1
+        try:
+            yield
+        finally:
+            self.checkouts -= 1
+            if not self.checkouts:
+                await self.release()
+
+    @asynccontextmanager
+    async def transaction(self, isolation: str | None = None):
+        async with self.checkout():
+            conn = await self.acquire()
+            async with conn.transaction(isolation=isolation):
+                yield
+
+        # Only once the outermost transaction has committed; a nested one is a savepoint that may still roll back.
+        if self.on_commit and not self.is_in_transaction():
+            self.on_commit()
+
+    def is_in_transaction(self) -> bool:
+        return self.conn is not None and self.conn.is_in_transaction()
+
+    async def gather(self, *calls) -> list:
+        # Runs independent read-only calls, each given a connection, at the same time on extra pooled connections.
+        if len(calls) < 2 or self.is_in_transaction():
+            # A transaction's reads must see its own writes, so they stay on its connection.
+            return [await call(self) for call in calls]
+
+        async def run_call(call):
+            async with self.parallel_reads:
+                fork = ParallelReadConnection(self)
+                async with fork.checkout():
+                    return await call(fork)
+
+        return list(await asyncio.gather(*(run_call(call) for call in calls)))
+
+    async def run(self, operation: str, query: str, args: tuple, caller: str | None = None, **kwargs):
+        # Two frames up is the repository method that issued the statement.
+        caller = caller or sys._getframe(2).f_code.co_qualname
+
+        async with self.checkout():
+            conn = await self.acquire()
+            start = time.perf_counter()
+            with query_span(operation, query, caller):
+                result = await getattr(conn, operation)(query, *args, **kwargs)
+            duration = time.perf_counter() - start
+
+        if self.slow_query_log:
+            self.slow_query_log.observe(query, args, duration, caller, self.pool)
+
+        return result
+
+    async def execute(self, query: str, *args, timeout: float | None = None) -> str:
+        return await self.run("execute", query, args, timeout=timeout)
+
+    async def executemany(self, query: str, args, timeout: float | None = None) -> None:
+        await self.run("executemany", query, (args,), timeout=timeout)
+
+    async def fetch(self, query: str, *args, timeout: float | None = None) -> list[asyncpg.Record]:
+        return await self.run("fetch", query, args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: float | None = None) -> asyncpg.Record | None:
+        return await self.run("fetchrow", query, args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: float | None = None):
+        return await self.run("fetchval", query, args, column=column, timeout=timeout)
+
+
+# Routers pass a LazyConnection; jobs and background tasks pass a connection taken from the pool directly.
+DatabaseConnection = asyncpg.Connection | LazyConnection
+
+class ParallelReadConnection(LazyConnection):
+    def __init__(self, parent: LazyConnection):
+        super().__init__(parent.pool, parent.slow_query_log)
+        self.parent = parent
+        self.shares_parent = False
+
+    async def acquire(self, timeout: float | None = None) -> asyncpg.Connection | None:
+        # Taken on the first statement, so calls that never query never hold a connection. Holding one connection
+        # while waiting on another could starve the pool, so only one that comes free at once is taken; otherwise
+        # the statements share the parent's connection.
+        async with self.lock:
+            if not self.conn and not self.shares_parent:
+                if self.pool.get_idle_size() == 0:
+                    self.shares_parent = True
+                else:
+                    try:
+                        with span("postgres acquire", SPAN_KIND_CLIENT):
+                            self.conn = await self.pool.acquire(timeout=self.parent.parallel_read_acquire_timeout)
+                    except asyncio.TimeoutError:
+                        self.shares_parent = True
+        return self.conn
+
+    async def run(self, operation: str, query: str, args: tuple, caller: str | None = None, **kwargs):
+        caller = caller or sys._getframe(2).f_code.co_qualname
+
+        if await self.acquire():
+            return await super().run(operation, query, args, caller, **kwargs)
+
+        async with self.parent.shared_lock:
+            return await self.parent.run(operation, query, args, caller, **kwargs)
+
+
 class RedisClient:
-    def __init__(self, host: str, port: int, password: str):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        password: str,
+        socket_timeout: float = 0.25,
+        connect_timeout: float = 0.25,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 5.0,
+    ):
         self.host = host
         self.port = port
         self.password = password
+        self.socket_timeout = socket_timeout
+        self.connect_timeout = connect_timeout
+        self.breaker = CircuitBreaker(breaker_failure_threshold, breaker_reset_timeout)
         self.pool = None
         self.redis = None
 
     def setup(self):
+        # Calls are synchronous on the event loop, so a stalled Redis must fail fast rather than stall every request.
         self.pool = redis.ConnectionPool(
             host=self.host,
             port=self.port,
             password=self.password,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.connect_timeout,
             decode_responses=True,
         )
-        self.redis = redis.Redis(connection_pool=self.pool)
-        self.redis.flushdb()
+        self.redis = CircuitBreakerRedis(self.breaker, connection_pool=self.pool)
+
+    async def warm_up(self):
+        await asyncio.to_thread(self.redis.ping)  # type: ignore
 
     def teardown(self):
-        self.redis.flushdb()  # type: ignore
         self.pool.disconnect()  # type: ignore
 
 
 http_bearer = HTTPBearer()
+optional_http_bearer = HTTPBearer(auto_error=False)
 
 
 def get_access_token(credentials: HTTPAuthorizationCredentials = Depends(http_bearer)):
@@ -112,18 +671,126 @@ def get_settings(request: Request) -> Settings:
     return request.app.state.settings
 
 
+def verify_admin_token(
+    x_admin_token: str | None = Header(default=None), settings: Settings = Depends(get_settings)
+) -> None:
+    if not settings.ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token.")
+
+
 async def get_postgres_client(request: Request) -> PostgresClient:
     return request.app.state.postgres_client
 
 
-async def get_postgres_conn(postgres_client: PostgresClient = Depends(get_postgres_client)):
-    async with postgres_client.pool.acquire() as conn:  # type: ignore
-        yield conn
+async def get_item_change_feed(request: Request) -> ItemChangeFeed:
+    return request.app.state.item_change_feed
+
+
+async def get_item_name_index(request: Request) -> ItemNameIndex:
+    return request.app.state.item_name_index
+
+
+async def get_catalog_snapshot(request: Request) -> CatalogSnapshot | None:
+    return request.app.state.catalog_snapshot
+
+
+async def get_item_single_flight(request: Request) -> SingleFlight:
+    return request.app.state.item_single_flight
+
+
+async def get_slow_query_log(request: Request) -> SlowQueryLog:
+    return request.app.state.slow_query_log
+
+
+async def get_tracer(request: Request) -> Tracer:
+    return request.app.state.tracer
+
+
+async def get_job_runner(request: Request) -> JobRunner:
+    return request.app.state.job_runner
+
+
+async def get_response_cache(request: Request) -> ResponseCache:
+    return request.app.state.response_cache
 
 
 async def get_redis_client(request: Request) -> RedisClient:
     return request.app.state.redis_client
 
 
+async def get_rating_buffer(request: Request) -> RatingBuffer:
+    return request.app.state.rating_buffer
+
+
+async def get_revocation_cache(request: Request) -> RevocationCache:
+    return request.app.state.revocation_cache
+
+
 async def get_redis(redis_client: RedisClient = Depends(get_redis_client)) -> redis.Redis:
     return redis_client.redis  # type: ignore
+
+
+def get_access_token_user_id(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_http_bearer),
+    settings: Settings = Depends(get_settings),
+) -> int | None:
+    if not credentials:
+        return None
+
+    try:
+        claims = jwt.decode(jwt=credentials.credentials, key=settings.JWT_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+
+    return claims.get("sub")
+
+
+async def get_postgres_conn(
+    postgres_client: PostgresClient = Depends(get_postgres_client),
+    settings: Settings = Depends(get_settings),
+    redis: redis.Redis = Depends(get_redis),
+    user_id: int | None = Depends(get_access_token_user_id),
+    slow_query_log: SlowQueryLog = Depends(get_slow_query_log),
+) -> LazyConnection:
+    def mark_recent_write() -> None:
+        try:
+            redis.set(f"user:{user_id}:recent_write", "1", settings.READ_YOUR_WRITES_WINDOW)
+        except redis_unavailable_errors:
+            # Reads stay on the primary while Redis is unreachable, see get_postgres_read_conn.
+            pass
+
+    # Set once a write commits, so only users who have just written are kept off the replicas.
+    return LazyConnection(
+        postgres_client.pool,  # type: ignore
+        slow_query_log,
+        settings.POSTGRES_MAX_PARALLEL_READS,
+        settings.POSTGRES_PARALLEL_READ_ACQUIRE_TIMEOUT,
+        mark_recent_write if postgres_client.replica_pools and user_id is not None else None,
+    )
+
+
+async def get_postgres_read_conn(
+    postgres_client: PostgresClient = Depends(get_postgres_client),
+    settings: Settings = Depends(get_settings),
+    redis: redis.Redis = Depends(get_redis),
+    user_id: int | None = Depends(get_access_token_user_id),
+    slow_query_log: SlowQueryLog = Depends(get_slow_query_log),
+) -> LazyConnection:
+    pool = postgres_client.pool
+
+    if postgres_client.replica_pools:
+        try:
+            recent_write = user_id is not None and redis.exists(f"user:{user_id}:recent_write")
+        except redis_unavailable_errors:
+            # Without Redis a recent write cannot be ruled out, so reads fall back to the primary.
+            recent_write = True
+
+        if not recent_write:
+            pool = postgres_client.get_read_pool()
+
+    return LazyConnection(
+        pool,  # type: ignore
+        slow_query_log,
+        settings.POSTGRES_MAX_PARALLEL_READS,
+        settings.POSTGRES_PARALLEL_READ_ACQUIRE_TIMEOUT,
+    )
@@ -0,0 +1,284 @@
+import asyncio
+import functools
+import inspect
+import json
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+import redis
+from fastapi.routing import APIRoute
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Span:
+    def __init__(self, trace: "Trace", name: str, parent_id: str | None, kind: int, attributes: dict):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+        trace.spans.append(self)
+
+    def finish(self) -> None:
+        self.end = time.time_ns()
+
+    def get_duration(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1_000_000
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+
+    def get_root(self) -> Span:
+        return self.spans[0]
+
+    def find_child(self, parent: Span, name: str) -> Span | None:
+        for child in self.spans:
+            if child.parent_id == parent.span_id and child.name == name:
+                return child
+
+        return None
+
+    def get_tree(self) -> dict:
+        children = {}
+        for child in sorted(self.spans, key=lambda traced_span: traced_span.start):
+            children.setdefault(child.parent_id, []).append(child)
+
+        def to_dict(traced_span: Span) -> dict:
+            return {
+                "name": traced_span.name,
+                "duration": traced_span.get_duration(),
+                "offset": (traced_span.start - self.get_root().start) / 1_000_000,
+                "attributes": traced_span.attributes,
+                "error": traced_span.error,
+                "children": [to_dict(child) for child in children.get(traced_span.span_id, [])],
+            }
+
+        return {"trace_id": self.trace_id, **to_dict(self.get_root())}
+
+    def to_otlp(self, service_name: str) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": to_otlp_attributes({"service.name": service_name})},
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [self.span_to_otlp(s) for s in self.spans]}],
+                }
+            ]
+        }
+
+    def span_to_otlp(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start),
+            "endTimeUnixNano": str(span.end or span.start),
+            "attributes": to_otlp_attributes(span.attributes),
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        if span.error:
+            otlp_span["status"] = {"code": 2, "message": span.error}
+
+        return otlp_span
+
+
+def to_otlp_attributes(attributes: dict) -> list[dict]:
+    otlp_attributes = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            otlp_value = {"boolValue": value}
+        elif isinstance(value, int):
+            otlp_value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            otlp_value = {"doubleValue": value}
+        else:
+            otlp_value = {"stringValue": str(value)}
+        otlp_attributes.append({"key": key, "value": otlp_value})
+
+    return otlp_attributes
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def is_tracing() -> bool:
+    return current_span.get() is not None
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        child.finish()
+        current_span.reset(token)
+
+
+def query_span(operation: str, query: str, caller: str):
+    if not is_tracing():
+        return nullcontext()
+
+    attributes = {
+        "db.system": "postgresql",
+        "db.operation": operation,
+        "db.statement": " ".join(query.split()),
+        "code.function": caller,
+    }
+    return span(f"postgres {caller}", SPAN_KIND_CLIENT, **attributes)
+
+
+def add_span(name: str, parent: Span, start: int, end: int) -> Span:
+    finished_span = Span(parent.trace, name, parent.span_id, SPAN_KIND_INTERNAL, {})
+    finished_span.start, finished_span.end = start, end
+    return finished_span
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, buffer_size: int, export_path: str | None, service_name: str):
+        self.sample_rate = sample_rate
+        self.traces: deque[Trace] = deque(maxlen=buffer_size)
+        self.export_path = export_path
+        self.service_name = service_name
+        self.export_lock = threading.Lock()
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            yield None
+            return
+
+        trace = Trace()
+        root = Span(trace, name, None, SPAN_KIND_SERVER, attributes)
+        token = current_span.set(root)
+        try:
+            yield root
+        except BaseException as exc:
+            root.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            root.finish()
+            current_span.reset(token)
+            self.traces.append(trace)
+
+    def write(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_otlp(self.service_name), separators=(",", ":"))
+        with self.export_lock, open(self.export_path, "a") as f:  # type: ignore
+            f.write(line + "\n")
+
+    async def export(self, trace: Trace) -> None:
+        if not self.export_path:
+            return
+
+        try:
+            await asyncio.to_thread(self.write, trace)
+        except OSError as exc:
+            print(f"Trace export failed: {exc}")
+
+    def get_trace(self, trace_id: str) -> Trace | None:
+        for trace in self.traces:
+            if trace.trace_id == trace_id:
+                return trace
+
+        return None
+
+    def get_summaries(self) -> list[dict]:
+        return [
+            {
+                "trace_id": trace.trace_id,
+                "name": trace.get_root().name,
+                "duration": trace.get_root().get_duration(),
+                "spans": len(trace.spans),
+            }
+            for trace in reversed(self.traces)
+        ]
+
+
+class TracedRoute(APIRoute):
+    # Splits each sampled request into dependency resolution, the endpoint itself and response serialization.
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = trace_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            with span(f"route {self.path}") as route_span:
+                response = await handler(request)
+
+                if route_span:
+                    endpoint_span = route_span.trace.find_child(route_span, "endpoint")
+                    if endpoint_span and endpoint_span.end:
+                        add_span("serialization", route_span, endpoint_span.end, time.time_ns())
+
+            return response
+
+        return traced_handler
+
+
+def trace_endpoint(endpoint):
+    @functools.wraps(endpoint)
+    async def traced_endpoint(*args, **kwargs):
+        route_span = current_span.get()
+        if route_span is None:
+            return await endpoint(*args, **kwargs)
+
+        # Everything that ran under the route so far was dependency resolution.
+        dependencies_span = add_span("dependencies", route_span, route_span.start, time.time_ns())
+        for traced_span in route_span.trace.spans:
+            if traced_span.parent_id == route_span.span_id and traced_span is not dependencies_span:
+                traced_span.parent_id = dependencies_span.span_id
+
+        with span("endpoint"):
+            return await endpoint(*args, **kwargs)
+
+    return traced_endpoint
+
+
+class TracedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error: bool = True):
+        if not is_tracing():
+            return super().execute(raise_on_error)
+
+        commands = " ".join(str(args[0]) for args, _ in self.command_stack)
+        with span("redis pipeline", SPAN_KIND_CLIENT, **{"db.system": "redis", "db.operation": commands}):
+            return super().execute(raise_on_error)
+
+
+class TracedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        if not is_tracing():
+            return super().execute_command(*args, **options)
+
+        with span(f"redis {args[0]}", SPAN_KIND_CLIENT, **{"db.system": "redis", "db.operation": str(args[0])}):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> TracedPipeline:
+        return TracedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)